@@ -0,0 +1,391 @@
+"""
+Micro-benchmarks for the local data path.
+
+Times activity conversion (`ActivityModel.from_strava_activity`), validation
+(`AthleteData.model_validate`), serialization (`model_dump(mode="json")`, w/
+all the computed fields), `write_json`, `load_json_n_validate`, a lazy
+`JSONStore` load & lookup and `DataProcessor.update_activities` (into a
+`JSONStore`, a `JournalStore` & a `ShardedStore`) on synthetic corpora, w/
+& without splits and weather. Reports latency percentiles, throughput &
+peak (traced) memory for each, and saves or compares against a baseline
+file.
+
+Usage:
+    python -m benchmarks.micro_benchmark --save-baseline        # record
+    python -m benchmarks.micro_benchmark                        # compare
+    python -m benchmarks.micro_benchmark --sizes 1000 --variants full
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from stravalib.model import DetailedActivity
+
+from benchmarks.mock_strava import MockAthlete
+from src.mediocremiles.data_processor import DataProcessor
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.stores.json_store import JSONStore
+from src.mediocremiles.stores.journal_store import JournalStore
+from src.mediocremiles.stores.sharded_store import ShardedStore
+from utils import load_json_n_validate, write_json
+
+
+log = logging.getLogger("app.micro_benchmark")
+
+
+SIZES = [1_000, 10_000, 100_000]
+
+# Corpus variants: (splits per activity, w/ weather).
+VARIANTS = {
+    "plain": (0, False),
+    "full": (5, True)
+}
+
+# Activities per `update_activities` call (a listing page).
+UPDATE_BATCH = 200
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+
+
+@dataclass
+class Result:
+    operation: str
+    size: int
+    variant: str
+    items: int
+    samples: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    throughput: float
+    peak_mb: float
+    
+    @property
+    def key(self) -> str:
+        return f"{self.operation}/{self.size}/{self.variant}"
+
+
+@dataclass
+class Corpus:
+    size: int
+    variant: str
+    strava_activities: List[DetailedActivity]
+    data: AthleteData
+    raw: Dict[str, Any]
+
+
+def make_corpus(size: int, variant: str) -> Corpus:
+    """
+    Builds `size` synthetic stravalib activities, their ActivityModels (w/
+    weather for the "full" variant) & the JSON-mode dump of the lot.
+    """
+    n_splits, with_weather = VARIANTS[variant]
+    athlete = MockAthlete(size, n_splits, latlng=with_weather)
+    
+    strava_activities = []
+    for i in range(size):
+        raw = athlete.detailed(i)
+        if not n_splits: raw.pop("splits_standard")
+        strava_activities.append(DetailedActivity.model_validate(raw))
+    
+    activities = {}
+    for i, strava_activity in enumerate(strava_activities):
+        activity = ActivityModel.from_strava_activity(strava_activity)
+        if with_weather: activity.weather = make_weather(i)
+        activities[activity.id] = activity
+    
+    data = AthleteData(activities=activities)
+    return Corpus(size, variant, strava_activities, data, data.model_dump(mode="json"))
+
+
+def make_weather(i: int) -> Weather:
+    return Weather(
+        temperature=10 + i % 25,
+        dew_point=5 + i % 10,
+        humidity=40 + i % 50,
+        pressure=1013.0,
+        wind_direction=float(i % 360),
+        wind_speed=float(i % 30),
+        snow=0.0,
+        precipitation=0.1 * (i % 4),
+        conditions="Clear"
+    )
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    if not samples: return 0.0
+    rank = max(0, min(len(samples) - 1, round(q / 100 * len(samples)) - 1))
+    return samples[rank]
+
+
+def peak_memory(func: Callable[[], Any]) -> float:
+    """
+    Returns the peak memory (MB) traced while running `func` once.
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 ** 2
+
+
+def measure(
+    operation: str,
+    corpus: Corpus,
+    func: Callable[[], Any],
+    items: int,
+    min_repeats: int,
+    max_repeats: int,
+    budget: float
+) -> Result:
+    """
+    Times whole calls of `func` (each handling `items` activities) until
+    `max_repeats` calls or `budget` seconds, but at least `min_repeats`.
+    """
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < max_repeats and (
+        len(timings) < min_repeats or time.perf_counter() - start < budget
+    ):
+        call_start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - call_start)
+    
+    median = percentile(sorted(timings), 50)
+    return _result(
+        operation, corpus, items, timings, items / median, peak_memory(func))
+
+
+def measure_each(
+    operation: str,
+    corpus: Corpus,
+    func: Callable[[Any], Any],
+    inputs: List[Any]
+) -> Result:
+    """
+    Times `func` on each input separately (throughput is over all inputs).
+    """
+    timings = []
+    for item in inputs:
+        call_start = time.perf_counter()
+        func(item)
+        timings.append(time.perf_counter() - call_start)
+    peak = peak_memory(lambda: [func(item) for item in inputs])
+    return _result(
+        operation, corpus, 1, timings, len(inputs) / sum(timings), peak)
+
+
+def _result(
+    operation: str,
+    corpus: Corpus,
+    items: int,
+    timings: List[float],
+    throughput: float,
+    peak_mb: float
+) -> Result:
+    timings_ms = sorted(t * 1000 for t in timings)
+    return Result(
+        operation=operation,
+        size=corpus.size,
+        variant=corpus.variant,
+        items=items,
+        samples=len(timings),
+        p50_ms=percentile(timings_ms, 50),
+        p95_ms=percentile(timings_ms, 95),
+        p99_ms=percentile(timings_ms, 99),
+        throughput=throughput,
+        peak_mb=peak_mb
+    )
+
+
+def run_corpus(
+    corpus: Corpus,
+    workdir: Path,
+    min_repeats: int,
+    max_repeats: int,
+    budget: float
+) -> List[Result]:
+    """
+    Runs every operation on a corpus.
+    """
+    args = (min_repeats, max_repeats, budget)
+    results = [
+        measure_each(
+            "from_strava_activity", corpus,
+            ActivityModel.from_strava_activity, corpus.strava_activities),
+        measure(
+            "model_validate", corpus,
+            lambda: AthleteData.model_validate(corpus.raw), corpus.size, *args),
+        measure(
+            "model_dump", corpus,
+            lambda: corpus.data.model_dump(mode="json"), corpus.size, *args),
+        measure(
+            "write_json", corpus,
+            lambda: write_json(workdir / "write.json", corpus.raw), corpus.size, *args),
+        measure(
+            "load_json_n_validate", corpus,
+            lambda: load_json_n_validate(workdir / "write.json", AthleteData),
+            corpus.size, *args),
+        measure(
+            "lazy_load_lookup", corpus,
+            lambda: lookup(JSONStore(workdir / "write.json")), corpus.size, *args)
+    ]
+    
+    # A page of updated activities stored into the full corpus.
+    page = [
+        a.model_copy(update={"kudos_count": (a.kudos_count or 0) + 1})
+        for a in list(corpus.data.activities.values())[:UPDATE_BATCH]
+    ]
+    for operation, store in [
+        ("update_activities", JSONStore(workdir / "strava_data.json")),
+        ("update_journal", JournalStore(workdir / "journal_data.json")),
+        ("update_sharded", ShardedStore(workdir / "shards"))
+    ]:
+        store.save(corpus.data.model_copy(
+            update={"activities": dict(corpus.data.activities)}))
+        processor = DataProcessor(store=store)
+        
+        def update() -> None:
+            callback = processor.update_activities(page)
+            assert callback == "complete", callback
+        
+        results.append(measure(operation, corpus, update, len(page), *args))
+    return results
+
+
+def lookup(store: JSONStore) -> ActivityModel:
+    """
+    Loads a store & gets its last activity.
+    """
+    activities = store.load().activities
+    return activities[list(activities)[-1]]
+
+
+def report(
+    results: List[Result], baseline: Optional[Dict[str, Dict[str, Any]]] = None
+) -> str:
+    lines = [
+        f"{'operation':<22} {'size':>7} {'variant':<7} {'p50 ms':>10} "
+        f"{'p95 ms':>10} {'p99 ms':>10} {'items/s':>11} {'peak MB':>8}"
+        + ("  p50 vs baseline" if baseline else "")
+    ]
+    for r in results:
+        line = (
+            f"{r.operation:<22} {r.size:>7} {r.variant:<7} {r.p50_ms:>10.3f} "
+            f"{r.p95_ms:>10.3f} {r.p99_ms:>10.3f} {r.throughput:>11.0f} "
+            f"{r.peak_mb:>8.1f}"
+        )
+        if baseline and r.key in baseline:
+            line += f"  {r.p50_ms / baseline[r.key]['p50_ms']:>6.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def regressions(
+    results: List[Result],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float
+) -> List[Tuple[Result, float]]:
+    """
+    Returns the results (& their p50 ratio) more than `threshold` times
+    slower than the baseline.
+    """
+    slower = []
+    for r in results:
+        if r.key not in baseline or not baseline[r.key]["p50_ms"]: continue
+        ratio = r.p50_ms / baseline[r.key]["p50_ms"]
+        if ratio > threshold: slower.append((r, ratio))
+    return slower
+
+
+def load_baseline(path: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+    if not path.exists(): return None
+    return {
+        f"{r['operation']}/{r['size']}/{r['variant']}": r
+        for r in json.loads(path.read_text())["results"]
+    }
+
+
+def save_baseline(path: Path, results: List[Result]) -> None:
+    path.parent.mkdir(exist_ok=True, parents=True)
+    path.write_text(json.dumps({
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [asdict(r) for r in results]
+    }, indent=2))
+    return None
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Data path micro-benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                       help='Corpus sizes (activities)')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS),
+                       default=list(VARIANTS),
+                       help='Corpora w/out ("plain") or w/ ("full") splits & weather')
+    parser.add_argument('--min-repeats', type=int, default=3,
+                       help='Minimum calls timed per operation')
+    parser.add_argument('--max-repeats', type=int, default=20,
+                       help='Maximum calls timed per operation')
+    parser.add_argument('--budget', type=float, default=5.0,
+                       help='Seconds spent timing an operation (after the minimum calls)')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+                       help='Baseline results file')
+    parser.add_argument('--save-baseline', action='store_true',
+                       help='Save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                       help='p50 slowdown vs the baseline reported as a regression')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Pydantic serializer warnings are silenced in the app too (see logger.py).
+    warnings.filterwarnings("ignore", module="pydantic")
+    
+    results = []
+    with tempfile.TemporaryDirectory(prefix="mediocremiles_micro_") as workdir:
+        for size in args.sizes:
+            for variant in args.variants:
+                log.info(f"Building {size} activity {variant} corpus...")
+                corpus = make_corpus(size, variant)
+                results.extend(run_corpus(
+                    corpus, Path(workdir), args.min_repeats,
+                    args.max_repeats, args.budget
+                ))
+                del corpus
+    
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    print(report(results, baseline))
+    
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        log.info(f"Saved baseline to: {args.baseline}")
+    elif baseline:
+        slower = regressions(results, baseline, args.threshold)
+        for r, ratio in slower:
+            log.warning(f"Regression: {r.key} p50 is {ratio:.2f}x the baseline.")
+        if slower: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
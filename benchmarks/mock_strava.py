@@ -0,0 +1,442 @@
+"""
+Contains the MockStrava server, a local stand-in for the Strava v3 API.
+
+Run w/ `python -m benchmarks.mock_strava --port 8765` and set `routes.api_url`
+in configs/config.json to `http://localhost:8765` to point StravaClient at it.
+"""
+import argparse
+import bisect
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+log = logging.getLogger("app.mock_strava")
+
+
+ATHLETE_ID = 1000
+
+# Endpoints served, matched against the request path.
+ROUTES = {
+    "athlete": re.compile(r"^/api/v3/athlete$"),
+    "activities": re.compile(r"^/api/v3/athlete/activities$"),
+    "activity": re.compile(r"^/api/v3/activities/(\d+)$"),
+    "zones": re.compile(r"^/api/v3/athlete/zones$"),
+    "stats": re.compile(r"^/api/v3/athletes/(\d+)/stats$"),
+    "token": re.compile(r"^/oauth/token$")
+}
+
+SPORT_TYPES = ["Run", "Run", "Run", "Ride", "Walk"]
+
+# Strava's rate limit window, in seconds.
+SHORT_WINDOW = 15 * 60
+
+
+
+def _iso(date: datetime) -> str:
+    return date.isoformat().replace("+00:00", "Z")
+
+
+@dataclass
+class MockAthlete:
+    """
+    Synthetic athlete w/ `n_activities` spread evenly over `years` of history
+    (ending now). Activities are generated from their index, so the same
+    settings always give the same activities.
+    """
+    n_activities: int = 1000
+    n_splits: int = 5
+    years: float = 3
+    latlng: bool = False
+    seed: int = 0
+    created_at: datetime = field(init=False)
+    start_dates: List[datetime] = field(init=False)
+    
+    def __post_init__(self):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.created_at = now - timedelta(days=365 * self.years)
+        self.start_dates = []
+        self.add_activities(self.n_activities, end=now)
+    
+    def add_activities(self, n: int, end: Optional[datetime] = None) -> None:
+        """
+        Adds `n` activities after the latest one (spread up to `end`).
+        """
+        start = self.start_dates[-1] if self.start_dates else self.created_at
+        end = end or datetime.now(timezone.utc).replace(microsecond=0)
+        step = (end - start) / max(n, 1)
+        self.start_dates.extend(start + step * (k + 1) for k in range(n))
+        self.n_activities = len(self.start_dates)
+        return None
+    
+    def summary(self, index: int) -> Dict[str, Any]:
+        rng = random.Random(self.seed * 1_000_003 + index)
+        start_date = self.start_dates[index]
+        sport_type = SPORT_TYPES[index % len(SPORT_TYPES)]
+        moving_time = rng.randint(1200, 5400)
+        speed = rng.uniform(2.5, 4.0) if sport_type != "Ride" else rng.uniform(6, 9)
+        latlng = (
+            [round(41.6 + rng.uniform(-0.1, 0.1), 4),
+             round(-93.6 + rng.uniform(-0.1, 0.1), 4)]
+            if self.latlng else []
+        )
+        return {
+            "resource_state": 2,
+            "id": ATHLETE_ID * 10_000_000 + index,
+            "athlete": {"id": ATHLETE_ID, "resource_state": 1},
+            "name": f"Mock {sport_type} {index}",
+            "type": sport_type,
+            "sport_type": sport_type,
+            "start_date": _iso(start_date),
+            "start_date_local": _iso(start_date),
+            "timezone": "(GMT+00:00) UTC",
+            "distance": round(moving_time * speed, 1),
+            "moving_time": moving_time,
+            "elapsed_time": moving_time + rng.randint(0, 600),
+            "total_elevation_gain": round(rng.uniform(0, 150), 1),
+            "average_speed": round(speed, 3),
+            "max_speed": round(speed * 1.5, 3),
+            "average_heartrate": round(rng.uniform(130, 165), 1),
+            "max_heartrate": rng.randint(165, 190),
+            "average_cadence": round(rng.uniform(80, 90), 1),
+            "kudos_count": rng.randint(0, 20),
+            "workout_type": 0,
+            "pr_count": 0,
+            "gear_id": "g1",
+            "start_latlng": latlng,
+            "end_latlng": latlng
+        }
+    
+    def detailed(self, index: int) -> Dict[str, Any]:
+        activity = self.summary(index)
+        rng = random.Random(self.seed * 1_000_003 + index)
+        split_time = activity["moving_time"] // max(self.n_splits, 1)
+        activity.update({
+            "resource_state": 3,
+            "description": "",
+            "calories": round(activity["distance"] / 13, 1),
+            "device_name": "Mock Watch",
+            "suffer_score": rng.randint(10, 150),
+            "gear": {"id": "g1", "name": "Mock Shoe", "distance": 500000.0},
+            "splits_standard": [
+                {
+                    "split": k + 1,
+                    "distance": 1609.3,
+                    "elapsed_time": split_time,
+                    "moving_time": split_time,
+                    "elevation_difference": round(rng.uniform(-5, 5), 1),
+                    "average_speed": activity["average_speed"],
+                    "average_grade_adjusted_speed": activity["average_speed"],
+                    "average_heartrate": activity["average_heartrate"],
+                    "pace_zone": rng.randint(1, 5)
+                }
+                for k in range(self.n_splits)
+            ]
+        })
+        return activity
+    
+    def list_page(
+        self,
+        after: Optional[float],
+        before: Optional[float],
+        page: int,
+        per_page: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns a page of summary activities, oldest first if `after` is
+        given (as Strava does) & newest first otherwise.
+        """
+        lo, hi = 0, len(self.start_dates)
+        if after is not None:
+            lo = bisect.bisect_right(
+                self.start_dates, datetime.fromtimestamp(after, timezone.utc))
+        if before is not None:
+            hi = bisect.bisect_left(
+                self.start_dates, datetime.fromtimestamp(before, timezone.utc))
+        
+        indices = range(lo, max(lo, hi))
+        if after is None: indices = indices[::-1]
+        start = (page - 1) * per_page
+        return [self.summary(i) for i in indices[start:start + per_page]]
+    
+    def profile(self) -> Dict[str, Any]:
+        return {
+            "resource_state": 3,
+            "id": ATHLETE_ID,
+            "firstname": "Mock",
+            "lastname": "Athlete",
+            "created_at": _iso(self.created_at),
+            "updated_at": _iso(self.created_at)
+        }
+
+
+class MockStravaServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server for a MockAthlete.
+    
+    Each request waits `latency` seconds (+/- `jitter`), and fails w/ a 500
+    at `error_rate`. Responses carry Strava's rate-limit headers for the
+    current 15min window, and requests over `short_limit` (or `long_limit`)
+    get a 429. Requests are counted by endpoint in `calls`.
+    """
+    daemon_threads = True
+    
+    def __init__(
+        self,
+        athlete: MockAthlete,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        short_limit: int = 100_000,
+        long_limit: int = 1_000_000
+    ):
+        super().__init__((host, port), MockStravaHandler)
+        self.athlete = athlete
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        
+        self.calls: Counter = Counter()
+        self.served = 0
+        self._lock = threading.Lock()
+        self._window = 0
+        self._short_usage = self._long_usage = 0
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> "MockStravaServer":
+        """
+        Serves requests from a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        return None
+    
+    def handle_error(self, request: Any, client_address: Tuple[str, int]) -> None:
+        # Clients (e.g. an interrupted run) may drop connections mid-request.
+        log.debug(f"Error handling request from {client_address}", exc_info=True)
+        return None
+    
+    def count(self, endpoint: str, served: int = 0) -> Tuple[bool, Dict[str, str]]:
+        """
+        Counts a request (& the activities it `served`, if it's allowed).
+        Returns whether it's w/in the rate limits & the rate-limit headers
+        to send.
+        """
+        with self._lock:
+            self.calls[endpoint] += 1
+            
+            window = int(time.time()) // SHORT_WINDOW
+            if window != self._window:
+                self._window, self._short_usage = window, 0
+            self._short_usage += 1
+            self._long_usage += 1
+            allowed = (
+                self._short_usage <= self.short_limit
+                and self._long_usage <= self.long_limit
+            )
+            if allowed: self.served += served
+            limits = f"{self.short_limit},{self.long_limit}"
+            usage = f"{self._short_usage},{self._long_usage}"
+        
+        headers = {
+            "X-RateLimit-Limit": limits,
+            "X-RateLimit-Usage": usage,
+            "X-ReadRateLimit-Limit": limits,
+            "X-ReadRateLimit-Usage": usage
+        }
+        return allowed, headers
+
+
+class MockStravaHandler(BaseHTTPRequestHandler):
+    server: MockStravaServer
+    protocol_version = "HTTP/1.1"
+    # Headers & body are separate writes on a kept-alive connection, which
+    # Nagle's algorithm (& delayed ACKs) would hold back ~40ms.
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format: str, *args) -> None:
+        log.debug(format % args)
+        return None
+    
+    def do_GET(self) -> None:
+        self._handle("GET")
+        return None
+    
+    def do_POST(self) -> None:
+        self._handle("POST")
+        return None
+    
+    def _handle(self, method: str) -> None:
+        server = self.server
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if self.headers.get("Content-Length"):
+            body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+            params.update({k: v[-1] for k, v in parse_qs(body).items()})
+        
+        endpoint, match = next(
+            ((e, m) for e, p in ROUTES.items() if (m := p.match(url.path))),
+            (None, None)
+        )
+        if endpoint is None:
+            return self._send(404, {"message": "Record Not Found", "errors": []})
+        
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0: time.sleep(delay)
+        
+        if endpoint == "token":
+            if method != "POST":
+                return self._send(405, {"message": "Method Not Allowed", "errors": []})
+            server.count(endpoint)
+            return self._send(200, {
+                "token_type": "Bearer",
+                "access_token": f"mock-{random.getrandbits(64):x}",
+                "refresh_token": params.get("refresh_token") or "mock-refresh",
+                "expires_at": int(time.time()) + 6 * 3600,
+                "expires_in": 6 * 3600
+            })
+        
+        try:
+            payload = self._payload(endpoint, match, params)
+        except (ValueError, IndexError):
+            return self._send(404, {"message": "Record Not Found", "errors": []})
+        
+        failed = random.random() < server.error_rate
+        served = len(payload) if endpoint == "activities" else int(endpoint == "activity")
+        allowed, headers = server.count(endpoint, 0 if failed else served)
+        if not allowed:
+            return self._send(429, {"message": "Rate Limit Exceeded", "errors": []}, headers)
+        if failed:
+            return self._send(500, {"message": "Internal Server Error", "errors": []}, headers)
+        return self._send(200, payload, headers)
+    
+    def _payload(
+        self, endpoint: str, match: re.Match, params: Dict[str, str]
+    ) -> Any:
+        athlete = self.server.athlete
+        if endpoint == "athlete":
+            return athlete.profile()
+        if endpoint == "activities":
+            after, before = params.get("after"), params.get("before")
+            return athlete.list_page(
+                float(after) if after else None,
+                float(before) if before else None,
+                int(params.get("page", 1)),
+                int(params.get("per_page", 30))
+            )
+        if endpoint == "activity":
+            index = int(match.group(1)) - ATHLETE_ID * 10_000_000
+            if not 0 <= index < athlete.n_activities: raise IndexError(index)
+            return athlete.detailed(index)
+        if endpoint == "zones":
+            return {
+                "heart_rate": {
+                    "custom_zones": False,
+                    "zones": [
+                        {"min": 0, "max": 125}, {"min": 125, "max": 150},
+                        {"min": 150, "max": 165}, {"min": 165, "max": 180},
+                        {"min": 180, "max": -1}
+                    ]
+                }
+            }
+        if endpoint == "stats":
+            totals = {
+                "count": athlete.n_activities,
+                "distance": athlete.n_activities * 8000.0,
+                "moving_time": athlete.n_activities * 2700,
+                "elapsed_time": athlete.n_activities * 3000,
+                "elevation_gain": athlete.n_activities * 50.0
+            }
+            return {
+                "biggest_ride_distance": 100000.0,
+                "biggest_climb_elevation_gain": 500.0,
+                **{
+                    f"{period}_{sport}_totals": totals
+                    for period in ("recent", "ytd", "all")
+                    for sport in ("ride", "run", "swim")
+                }
+            }
+        raise ValueError(endpoint)
+    
+    def _send(
+        self,
+        status: int,
+        payload: Any,
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock Strava v3 API')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--activities', type=int, default=1000,
+                       help='Number of activities the athlete has')
+    parser.add_argument('--splits', type=int, default=5,
+                       help='Splits per detailed activity')
+    parser.add_argument('--years', type=float, default=3,
+                       help='Years of history the activities are spread over')
+    parser.add_argument('--latlng', action='store_true',
+                       help='Give activities start coordinates (weather lookups hit Meteostat)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                       help='Seconds each request takes')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                       help='Random +/- seconds added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                       help='Fraction of API requests that fail w/ a 500')
+    parser.add_argument('--short-limit', type=int, default=100_000,
+                       help='Requests allowed per 15 minutes')
+    parser.add_argument('--long-limit', type=int, default=1_000_000,
+                       help='Requests allowed per day')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    athlete = MockAthlete(args.activities, args.splits, args.years, args.latlng)
+    server = MockStravaServer(
+        athlete, args.host, args.port, args.latency, args.jitter,
+        args.error_rate, args.short_limit, args.long_limit
+    )
+    log.info(f"Serving {athlete.n_activities} mock activities at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
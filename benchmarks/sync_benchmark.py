@@ -0,0 +1,202 @@
+"""
+End-to-end sync benchmark against the MockStrava server.
+
+Runs `run.py` (`--all`, then `--detailed`, then an incremental `--sync` after
+new activities are added) in a scratch directory whose config points at a
+local mock server, and reports the activities/second, API calls & peak
+memory (max RSS) of each run.
+
+Usage: python -m benchmarks.sync_benchmark --activities 2000 --latency 0.02
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+from benchmarks.mock_strava import MockAthlete, MockStravaServer
+
+
+log = logging.getLogger("app.sync_benchmark")
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# (name, run.py arguments); new activities are added before "incremental".
+FLOWS = [
+    ("all", ["--all"]),
+    ("detailed", ["--detailed"]),
+    ("incremental", ["--sync"])
+]
+
+
+
+@dataclass
+class FlowResult:
+    flow: str
+    seconds: float
+    activities: int
+    api_calls: int
+    peak_rss_mb: float
+    returncode: int
+    
+    @property
+    def activities_per_second(self) -> float:
+        return self.activities / self.seconds if self.seconds else 0.0
+
+
+def make_workspace(
+    server: MockStravaServer, backend: str, directory: Optional[Path] = None
+) -> Path:
+    """
+    Creates a scratch directory w/ a config pointing at the mock server, and
+    a token that won't need refreshing.
+    """
+    workspace = Path(directory or tempfile.mkdtemp(prefix="mediocremiles_bench_"))
+    (workspace / "configs").mkdir(parents=True, exist_ok=True)
+    (workspace / "data").mkdir(exist_ok=True)
+    
+    config = json.loads((ROOT / "configs" / "config.json").read_text())
+    config["routes"]["api_url"] = server.url
+    config["http_cache"]["enabled"] = False
+    config["storage"]["backend"] = backend
+    config["rate_limits"].update(
+        short=server.short_limit, long=server.long_limit)
+    (workspace / "configs" / "config.json").write_text(json.dumps(config, indent=2))
+    shutil.copy(ROOT / "configs" / "logger.json", workspace / "configs")
+    
+    (workspace / config["paths"]["token"]).write_text(json.dumps({
+        "access_token": "mock-access",
+        "refresh_token": "mock-refresh",
+        "expires_at": int(time.time()) + 24 * 3600
+    }))
+    return workspace
+
+
+def run_flow(
+    name: str, args: List[str], server: MockStravaServer, workspace: Path
+) -> FlowResult:
+    """
+    Runs run.py w/ `args` in the workspace, counting the mock server's calls.
+    """
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+        "STRAVA_CLIENT_ID": "1",
+        "STRAVA_CLIENT_SECRET": "mock-secret"
+    }
+    calls, served = sum(server.calls.values()), server.served
+    
+    start = time.perf_counter()
+    with open(workspace / f"{name}.out", "w") as out:
+        process = subprocess.Popen(
+            [sys.executable, str(ROOT / "run.py"), *args],
+            cwd=workspace, env=env, stdout=out, stderr=subprocess.STDOUT
+        )
+        # wait4 gives the run's own resource usage (max RSS in KiB on Linux).
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    
+    return FlowResult(
+        flow=name,
+        seconds=seconds,
+        activities=server.served - served,
+        api_calls=sum(server.calls.values()) - calls,
+        peak_rss_mb=usage.ru_maxrss / 1024,
+        returncode=process.returncode
+    )
+
+
+def report(results: List[FlowResult]) -> str:
+    lines = [
+        f"{'flow':<12} {'seconds':>8} {'activities':>10} {'act/s':>8} "
+        f"{'api calls':>9} {'peak MB':>8}  status"
+    ]
+    for r in results:
+        lines.append(
+            f"{r.flow:<12} {r.seconds:>8.2f} {r.activities:>10} "
+            f"{r.activities_per_second:>8.1f} {r.api_calls:>9} "
+            f"{r.peak_rss_mb:>8.1f}  {'ok' if r.returncode == 0 else f'exit {r.returncode}'}"
+        )
+    return "\n".join(lines)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end sync benchmark')
+    parser.add_argument('--activities', type=int, default=2000,
+                       help='Number of activities the mock athlete has')
+    parser.add_argument('--new-activities', type=int, default=25,
+                       help='Activities added before the incremental sync')
+    parser.add_argument('--splits', type=int, default=5,
+                       help='Splits per detailed activity')
+    parser.add_argument('--latency', type=float, default=0.0,
+                       help='Seconds each mock request takes')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                       help='Random +/- seconds added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                       help='Fraction of API requests that fail w/ a 500')
+    parser.add_argument('--short-limit', type=int, default=100_000,
+                       help='Requests allowed per 15 minutes')
+    parser.add_argument('--long-limit', type=int, default=1_000_000,
+                       help='Requests allowed per day')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json',
+                       help='Storage backend to sync into')
+    parser.add_argument('--flows', nargs='+', choices=[f for f, _ in FLOWS],
+                       default=[f for f, _ in FLOWS], help='Flows to run (in order)')
+    parser.add_argument('--workspace', type=Path,
+                       help='Directory to run in (default: a temporary one, removed after)')
+    parser.add_argument('--output', type=Path,
+                       help='Also write the results to this JSON file')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    athlete = MockAthlete(args.activities, args.splits)
+    server = MockStravaServer(
+        athlete, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, short_limit=args.short_limit,
+        long_limit=args.long_limit
+    ).start()
+    workspace = make_workspace(server, args.backend, args.workspace)
+    log.info(f"Mock Strava at {server.url}, running in {workspace}")
+    
+    results = []
+    try:
+        for name, flow_args in FLOWS:
+            if name not in args.flows: continue
+            if name == "incremental": athlete.add_activities(args.new_activities)
+            
+            result = run_flow(name, flow_args, server, workspace)
+            results.append(result)
+            if result.returncode != 0:
+                log.error(
+                    f"{name} failed, see {workspace / f'{name}.out'}"
+                    f"{'' if args.workspace else ' (kept)'}."
+                )
+                args.workspace = args.workspace or workspace
+    finally:
+        server.stop()
+        if args.workspace is None:
+            shutil.rmtree(workspace, ignore_errors=True)
+    
+    print(report(results))
+    if args.output:
+        args.output.write_text(json.dumps([
+            {**asdict(r), "activities_per_second": r.activities_per_second}
+            for r in results
+        ], indent=2))
+    
+    if any(r.returncode != 0 for r in results): sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
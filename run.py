@@ -4,10 +4,14 @@ from tqdm import tqdm
 from datetime import datetime
 
 from logger import LoggerManager
-from src.mediocremiles.models.athlete_data import AthleteData
 from src.mediocremiles.strava_client import StravaClient
 from src.mediocremiles.data_processor import DataProcessor
-from utils import get_date_n_days_ago, load_config, load_json_n_validate
+from src.mediocremiles.detail_pipeline import DetailPipeline
+from src.mediocremiles.detail_queue import DetailQueue
+from src.mediocremiles.sync_state import SyncState
+from src.mediocremiles.weather_enricher import WeatherEnricher
+from src.mediocremiles.window_backfill import WindowBackfill
+from utils import get_date_n_days_ago, load_config
 
 
 
@@ -42,9 +46,29 @@ def main():
                        help='Get athlete stats')
     parser.add_argument('--before', type=str,
                        help='Fetch activities before this date (YYYY-MM-DD format)')
+    parser.add_argument('--sync', action='store_true',
+                       help='Fetch activities newer than the last sync (default when no other options are given)')
+    parser.add_argument('--import-json', type=str, metavar='PATH',
+                       help='Replace the stored data with a strava_data.json file')
+    parser.add_argument('--export-json', type=str, metavar='PATH',
+                       help='Export the stored data to a strava_data.json file')
+    parser.add_argument('--export-columnar', nargs='?', const='parquet',
+                       choices=['parquet', 'feather'],
+                       help='Export activities, splits & weather to columnar files')
+    parser.add_argument('--enrich-weather', action='store_true',
+                       help='Add weather to stored activities that are missing it')
+    parser.add_argument('--offline', action='store_true',
+                       help='Only serve Strava responses from the HTTP cache')
     args = parser.parse_args()
     
-    client = StravaClient()
+    if any((args.import_json, args.export_json, args.export_columnar, args.enrich_weather)):
+        if args.import_json: processor.import_json(args.import_json)
+        if args.enrich_weather: WeatherEnricher(processor).run()
+        if args.export_json: processor.export_json(args.export_json)
+        if args.export_columnar: processor.export_columnar(file_format=args.export_columnar)
+        return
+    
+    client = StravaClient(offline=args.offline or None)
     
     if not client: return 
     
@@ -58,26 +82,61 @@ def main():
             log.error("Error: --before date must be in YYYY-MM-DD format")
             return
     
+    sync_state = SyncState()
+    sync = args.sync or not any((
+        args.all, args.days, args.before, args.detailed, args.zones,
+        args.athlete_stats
+    ))
+    
     if args.all: 
         log.info("Fetching all activities...")
     elif args.days is not None:
         after_date = get_date_n_days_ago(args.days)
         log.info(f"Fetching activities from the last {args.days} days...")
+    elif sync:
+        # Only the first sync w/out a sync state reads the store.
+        if sync_state.high_water_mark is None:
+            sync_state.bootstrap(processor.get_latest_activity_date())
+        after_date = sync_state.after
+        log.info(
+            "Syncing activities after "
+            f"{after_date.isoformat() if after_date else 'the first activity'}..."
+        )
     
-    summary_activities = None
-    if any((args.all, args.days, args.before)):
-        summary_activities = client.get_activities(
-            after=after_date, before=before_date)
-    
-        if summary_activities is None:
-            log.info("No new activities found.")
-            return 
+    summary_ids = None
+    if sync or any((args.all, args.days, args.before)):
+        summary_ids = []
+        def on_page(page: list) -> None:
+            summary_ids.extend(a.id for a in page)
+            if not args.all: sync_state.advance(page)
+            log.info(f"Stored {len(summary_ids)} summary activities...")
         
+        if args.all:
+            # The full history is listed in parallel time windows. The sync
+            # state only advances past windows that have all been listed.
+            backfill = WindowBackfill(client, processor).run(
+                before=before_date, on_page=on_page,
+                on_complete=sync_state.advance)
+            callback = "complete" if not backfill.failed else (
+                f"Failed to list or store {len(backfill.failed)} time windows: "
+                f"{[(w.after.isoformat(), w.before.isoformat()) for w in backfill.failed]}"
+            )
+        else:
+            # Pages are stored as they arrive, so an interrupted listing keeps
+            # the pages it already fetched.
+            pages = client.iter_activity_pages(after=after_date, before=before_date)
+            if sync:
+                pages = (sync_state.new_activities(page) for page in pages)
+            callback = processor.update_activity_pages(pages, on_page=on_page)
         log.info(
-            f"Fetched {len(summary_activities)} summary activities from Strava API"
+            f"Fetched {len(summary_ids)} summary activities from Strava API"
         )
         
-        assrt_complete_process(processor.update_activities(summary_activities))
+        if summary_ids:
+            WeatherEnricher(processor).run(summary_ids)
+        else:
+            log.info("No new activities found.")
+        assrt_complete_process(callback)
     
     if args.athlete_stats:
         log.info("Fetching athlete stats...")
@@ -90,35 +149,56 @@ def main():
         assrt_complete_process(processor.update_zones(zones))
     
     if args.detailed:
-        if summary_activities: log.info(
-            f"Fetching detailed data for {len(summary_activities)} activities...")
+        # Queued ids are checkpointed as they're stored, so an interrupted 
+        # backfill resumes w/ only the remaining activities.
+        detail_queue = DetailQueue()
+        if summary_ids:
+            detail_queue.add(summary_ids)
+        elif detail_queue.exists():
+            log.info("Resuming detailed activity queue...")
         else:
             try:
-                data = load_json_n_validate(CONFIG["paths"]["data"], AthleteData)
-                summary_activities = list(data.activities.values())
+                detail_queue.build(processor.store.get_activities().values())
             except Exception as e:
                 log.info("No data to get detailed data from.")
                 return
         
+        activity_ids = detail_queue.remaining()
+        if not activity_ids:
+            log.info("No activities need detailed data.")
+            detail_queue.clear()
+            return
+        
+        log.info(f"Fetching detailed data for {len(activity_ids)} activities...")
+        log.info(
+            "Rate limit ETA for detailed activities: "
+            f"{client.scheduler.eta(len(activity_ids))}"
+        )
+        
         pbar = tqdm(
-            summary_activities,
+            total=len(activity_ids),
             desc="Fetching detailed activities",
             unit="activity",
             ncols=120
         )
         
-        for activity in pbar:
-            detailed_activity = client.get_detailed_activity(activity)
-            
-            if detailed_activity: 
-                assrt_complete_process(processor.update_activities(detailed_activity))
-            else:
-                last_activity_idx = summary_activities.index(activity) - 1
-                last_activity = summary_activities[last_activity_idx]
-                log.error(
-                    "Error occured. Couldn't fetch all detailed activities."
-                    f" Last detailed activity fetched: {last_activity.id}"
-                )
+        def on_complete(activity_id: int, stored: bool) -> None:
+            if stored: detail_queue.mark_done([activity_id])
+            pbar.update(1)
+        
+        # Fetching, converting & storing run concurrently in separate stages.
+        pipeline = DetailPipeline(client, processor)
+        result = pipeline.run(activity_ids, on_complete=on_complete)
+        pbar.close()
+        
+        if result.completed:
+            WeatherEnricher(processor).run(result.completed)
+        
+        if result.failed:
+            log.error(
+                "Error occured. Couldn't fetch all detailed activities."
+                f" Failed activity ids: {result.failed}"
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+"""
+Contains the ColumnarExporter model.
+"""
+import logging
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union, Any, Literal
+
+import numpy as np
+import pandas as pd
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.models.split_arrays import (
+    SplitArrays, SPLIT_FIELDS, INT_FIELDS, DERIVED_FIELDS)
+from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.units import activity_units, weather_units
+from utils import load_config, write_json
+
+
+log = logging.getLogger("app.columnar_exporter")
+
+
+CONFIGS = load_config()
+
+
+# Fields exported as child tables rather than as activity columns.
+CHILD_FIELDS = {"splits_standard", "weather"}
+
+# Computed fields, filled for all rows at once rather than dumped per model.
+ACTIVITY_EXCLUDE = CHILD_FIELDS | set(ActivityModel.model_computed_fields)
+WEATHER_EXCLUDE = set(Weather.model_computed_fields)
+
+
+
+def _dtype(annotation: Any) -> str:
+    """
+    Returns the pandas dtype for a model field annotation.
+    """
+    annotation = str(annotation)
+    if "datetime" in annotation: return "datetime64[ns]"
+    if "int" in annotation: return "Int64"
+    if "float" in annotation: return "float64"
+    return "string"
+
+
+def _dtypes(model: Any, exclude: set = set()) -> Dict[str, str]:
+    """
+    Returns the pandas dtypes of a model's stored & computed fields.
+    """
+    dtypes = {
+        name: _dtype(field.annotation)
+        for name, field in model.model_fields.items()
+        if name not in exclude
+    }
+    dtypes.update({
+        name: _dtype(field.return_type)
+        for name, field in model.model_computed_fields.items()
+    })
+    return dtypes
+
+
+ACTIVITY_DTYPES = _dtypes(ActivityModel, CHILD_FIELDS)
+SPLIT_DTYPES = {
+    **{name: "Int64" if name in INT_FIELDS else "float64" for name in SPLIT_FIELDS},
+    **{name: "float64" for name in DERIVED_FIELDS}
+}
+WEATHER_DTYPES = _dtypes(Weather)
+
+
+class ColumnarExporter:
+    """
+    Exports activities to typed, columnar Parquet (or Feather) tables.
+
+    Writes one row per activity to `activities`, and splits & weather to flat
+    `splits` & `weather` tables joined on `activity_id`. Each table is
+    partitioned by activity year (`<table>/year=<year>/part-0.<format>`), so
+    readers can load only the columns & years they need. Zones & stats go to
+    `athlete.json`, so readers of the tables needn't parse the data file.
+    """
+    def __init__(
+        self,
+        output_dir: Optional[Union[str, Path]] = None,
+        file_format: Literal["parquet", "feather"] = "parquet"
+    ):
+        if file_format not in ("parquet", "feather"):
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+
+        self.output_dir = Path(
+            output_dir or CONFIGS["paths"]["columnar"]).resolve()
+        self.file_format = file_format
+
+    def export(
+        self,
+        activities: Dict[int, ActivityModel],
+        athlete: Optional[AthleteData] = None
+    ) -> Dict[str, int]:
+        """
+        Writes (replacing) all tables, & the athlete's zones & stats if given.
+        Returns the row count for each table.
+        """
+        frames = self.to_frames(activities)
+        for table, df in frames.items():
+            self._write_table(table, df)
+        if athlete is not None:
+            write_json(
+                self.output_dir / "athlete.json",
+                AthleteData(zones=athlete.zones, stats=athlete.stats)
+            )
+
+        log.info(
+            f"Exported {len(frames['activities'])} activities to: "
+            f"{self.output_dir.as_posix()}"
+        )
+        return {table: len(df) for table, df in frames.items()}
+
+    def to_frames(
+        self, activities: Dict[int, ActivityModel]
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Returns the activities, splits & weather tables as DataFrames.
+        """
+        activity_rows: List[Dict[str, Any]] = []
+        splits: List[Tuple[int, int, SplitArrays]] = []
+        weather_rows: List[Dict[str, Any]] = []
+
+        for activity in activities.values():
+            row = activity.model_dump(exclude=ACTIVITY_EXCLUDE)
+            start_date = activity.start_date
+
+            # Local wall-clock start, as the dashboard reads it, plus UTC.
+            row["start_date"] = start_date.replace(tzinfo=None)
+            row["start_date_utc"] = pd.Timestamp(start_date).tz_convert("UTC")
+            row["year"] = start_date.year
+            activity_rows.append(row)
+
+            if activity.splits_standard:
+                splits.append(
+                    (activity.id, start_date.year, activity.splits_standard))
+
+            if activity.weather:
+                weather_rows.append(
+                    {"activity_id": activity.id,
+                     **activity.weather.model_dump(exclude=WEATHER_EXCLUDE),
+                     "year": start_date.year}
+                )
+
+        activities_df = self._typed_frame(activity_rows, {
+            **ACTIVITY_DTYPES, "start_date_utc": "datetime64[ns, UTC]"},
+            activity_units)
+        return {
+            "activities": activities_df,
+            "splits": self._splits_frame(splits),
+            "weather": self._typed_frame(
+                weather_rows, WEATHER_DTYPES, weather_units, child=True)
+        }
+
+    @staticmethod
+    def _typed_frame(
+        rows: List[Dict[str, Any]],
+        dtypes: Dict[str, str],
+        units: Callable[[pd.DataFrame], Dict[str, pd.Series]],
+        child: bool = False
+    ) -> pd.DataFrame:
+        """
+        Returns a DataFrame of rows w/ the given column dtypes, & the computed
+        columns filled by `units`.
+        """
+        columns = (["activity_id"] if child else []) + list(dtypes) + ["year"]
+        df = pd.DataFrame.from_records(rows, columns=columns)
+
+        dtypes = {**dtypes, "year": "int32"}
+        if child: dtypes["activity_id"] = "int64"
+        df = df.astype(dtypes)
+        for name, values in units(df).items():
+            df[name] = values
+        return df.astype(dtypes)
+
+    @staticmethod
+    def _splits_frame(splits: List[Tuple[int, int, SplitArrays]]) -> pd.DataFrame:
+        """
+        Returns the splits table from (activity id, year, splits), w/ the unit
+        conversions computed for all splits at once.
+        """
+        lengths = [len(s) for _, _, s in splits]
+        df = SplitArrays.concat([s for _, _, s in splits]).to_frame()
+        df.insert(0, "activity_id", np.repeat([i for i, _, _ in splits], lengths))
+        df["year"] = np.repeat([y for _, y, _ in splits], lengths)
+        return df.astype({
+            "activity_id": "int64", **SPLIT_DTYPES, "year": "int32"})
+    
+    def _write_table(self, table: str, df: pd.DataFrame) -> None:
+        """
+        Replaces a table's year partitions.
+        """
+        table_dir = self.output_dir / table
+        if table_dir.exists():
+            shutil.rmtree(table_dir)
+
+        for year, partition in df.groupby("year"):
+            partition_dir = table_dir / f"year={year}"
+            partition_dir.mkdir(parents=True, exist_ok=True)
+
+            partition = partition.drop(columns="year").reset_index(drop=True)
+            file_path = partition_dir / f"part-0.{self.file_format}"
+            try:
+                if self.file_format == "parquet":
+                    partition.to_parquet(file_path, index=False)
+                else:
+                    partition.to_feather(file_path)
+            except ImportError as e:
+                log.error(f"Columnar export requires pyarrow: {e}")
+                raise
+        return None
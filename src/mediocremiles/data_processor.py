@@ -1,10 +1,14 @@
 """
 Contains the DataProcessor model.
 """
+import atexit
 import logging
+import time
+import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Union, Any, Iterator, Iterable, Callable
 
 from stravalib.model import DetailedActivity, AthleteStats
 from stravalib.strava_model import Zones
@@ -12,7 +16,14 @@ from stravalib.strava_model import Zones
 from src.mediocremiles.models.activity import ActivityModel
 from src.mediocremiles.models.athlete_zones import AthleteZones
 from src.mediocremiles.models.athlete_stats import AthleteStatistics
-from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.models.athlete_data import AthleteData, STORED_EXCLUDE
+from src.mediocremiles.columnar_exporter import ColumnarExporter
+from src.mediocremiles.rollups import Rollups
+from src.mediocremiles.stores.base import BaseStore
+from src.mediocremiles.stores.json_store import JSONStore
+from src.mediocremiles.stores.journal_store import JournalStore
+from src.mediocremiles.stores.sharded_store import ShardedStore
+from src.mediocremiles.stores.sqlite_store import SQLiteStore
 from utils import load_config, load_json_n_validate, write_json, to_list
 
 
@@ -20,33 +31,188 @@ log = logging.getLogger("app.activity_processor")
 
 
 CONFIGS = load_config()
+PROCESSING: Dict[str, Any] = CONFIGS.get("processing", {})
+STORAGE: Dict[str, Any] = CONFIGS.get("storage", {})
+ROLLUPS: Dict[str, Any] = CONFIGS.get("rollups", {})
+
+
+
+def get_store(backend: Optional[str] = None) -> BaseStore:
+    """
+    Returns the storage backend set in the configs (or given).
+    """
+    backend = backend or STORAGE.get("backend", "json")
+    if backend == "json":
+        return JSONStore(
+            CONFIGS["paths"]["data"], STORAGE.get("json_indent"),
+            STORAGE.get("compression")
+        )
+    if backend == "journal":
+        journal = STORAGE.get("journal", {})
+        return JournalStore(
+            CONFIGS["paths"]["data"], STORAGE.get("json_indent"),
+            journal.get("max_mb"), journal.get("max_age_hours"),
+            STORAGE.get("compression")
+        )
+    if backend == "sqlite":
+        return SQLiteStore(CONFIGS["paths"]["database"])
+    if backend == "sharded":
+        return ShardedStore(
+            CONFIGS["paths"]["shards"], STORAGE.get("json_indent"),
+            STORAGE.get("compression")
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
 
 
 
 class DataProcessor:
     """
     Just a wrapper for data processing.
+    
+    Data is persisted through a storage backend (see `get_store`). Outside of
+    a session every update is written straight to the store. Inside a session
+    (see `session`) updates are collected in memory and flushed every
+    `batch_size` updates or `flush_interval` seconds, and when the session
+    ends. Each flush also applies the written activities to the rollups (see
+    Rollups), if enabled.
     """
-    activity_data_file = Path(CONFIGS["paths"]["data"]).resolve()
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        store: Optional[BaseStore] = None,
+        rollups: Optional[Rollups] = None
+    ):
+        self.batch_size = batch_size or PROCESSING.get("batch_size", 50)
+        self.flush_interval = flush_interval or PROCESSING.get("flush_interval", 30)
+        self.store = store or get_store()
+        self.rollups = rollups
+        if rollups is None and store is None and ROLLUPS.get("enabled", True):
+            self.rollups = Rollups(CONFIGS["paths"]["rollups"])
+        
+        # Session state.
+        self.in_session = False
+        self._pending_activities: Dict[int, ActivityModel] = {}
+        self._pending_zones: Optional[AthleteZones] = None
+        self._pending_stats: Optional[AthleteStatistics] = None
+        self._last_flush = time.monotonic()
+        
+        # Called w/ the ids of activities written by each flush.
+        self.flush_callbacks: List[Callable[[List[int]], None]] = []
     
     def get_latest_activity_date(self) -> Optional[datetime]:
         """
         Get the date of the most recent activity.
         """
         try:
-            data = load_json_n_validate(self.activity_data_file, AthleteData)
-            activity_data: Dict[int, Dict] = data["activities"]
-            
-            datetimes = [
-                datetime.fromisoformat(a["start_date"])
-                for a in activity_data.values()
-            ]
-            
-            return max(datetimes)
+            return self.store.latest_activity_date()
         except (FileNotFoundError, Exception):
             log.debug("No existing data found.")
             return None
     
+    @contextmanager
+    def session(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ) -> Iterator["DataProcessor"]:
+        """
+        Context manager for a batched write session.
+        """
+        self.begin_session(batch_size, flush_interval)
+        try:
+            yield self
+        finally:
+            self.end_session()
+    
+    def begin_session(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ) -> None:
+        """
+        Starts collecting updates in memory.
+        """
+        if self.in_session: return None
+        
+        if batch_size: self.batch_size = batch_size
+        if flush_interval: self.flush_interval = flush_interval
+        
+        self.in_session = True
+        self._last_flush = time.monotonic()
+        
+        # Pending updates are still written if the process exits mid-session.
+        atexit.register(self.flush)
+        log.debug(
+            f"Started session (batch size: {self.batch_size}, "
+            f"flush interval: {self.flush_interval}s)."
+        )
+        return None
+    
+    def end_session(self) -> None:
+        """
+        Flushes pending updates and ends the session.
+        """
+        if not self.in_session: return None
+        
+        try:
+            self.flush()
+        finally:
+            atexit.unregister(self.flush)
+            self.in_session = False
+        log.debug("Ended session.")
+        return None
+    
+    @property
+    def _n_pending(self) -> int:
+        return (
+            len(self._pending_activities)
+            + (self._pending_zones is not None)
+            + (self._pending_stats is not None)
+        )
+    
+    def flush(self) -> None:
+        """
+        Writes pending updates to the store.
+        """
+        if not self._n_pending: return None
+        
+        n_pending = self._n_pending
+        flushed_ids = list(self._pending_activities)
+        if self._pending_activities:
+            self._build_rollups()
+            if self.rollups: self.rollups.begin(self._pending_activities)
+            self.store.upsert_activities(self._pending_activities)
+            if self.rollups: self.rollups.apply(self._pending_activities.values())
+            self._pending_activities = {}
+        if self._pending_zones is not None:
+            self.store.save_zones(self._pending_zones)
+            self._pending_zones = None
+        if self._pending_stats is not None:
+            self.store.save_stats(self._pending_stats)
+            self._pending_stats = None
+        
+        log.debug(f"Flushed {n_pending} updates.")
+        self._last_flush = time.monotonic()
+        
+        if flushed_ids:
+            for callback in self.flush_callbacks:
+                callback(flushed_ids)
+        return None
+    
+    def _commit(self) -> None:
+        """
+        Flushes pending updates, unless in a session and neither the batch
+        size nor flush interval has been reached.
+        """
+        if (
+            not self.in_session
+            or self._n_pending >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+        return None
+    
     @staticmethod
     def _format_activities(activities: List[DetailedActivity]) -> Dict[int, Dict]:
         """
@@ -56,68 +222,171 @@ class DataProcessor:
     
     def update_activities(
         self,
-        new_activities: Union[DetailedActivity, List[DetailedActivity]]
+        new_activities: Union[
+            DetailedActivity, ActivityModel,
+            List[Union[DetailedActivity, ActivityModel]]
+        ]
     ) -> str:
         """
-        Update JSON with new activities, avoiding duplicates.
+        Update store with new activities, avoiding duplicates. Activities
+        already converted to ActivityModel are stored as is. Activities w/out
+        weather keep the weather already stored for them.
         """
         try:
             activities = [
-                ActivityModel.from_strava_activity(a)
+                a if isinstance(a, ActivityModel)
+                else ActivityModel.from_strava_activity(a)
                 for a in to_list(new_activities)
             ]
             new_activity_data = self._format_activities(activities)
-                
-            try:
-                new_data = load_json_n_validate(self.activity_data_file, AthleteData)
-                new_data.activities.update(new_activity_data)
-            except FileNotFoundError:
-                new_data = AthleteData(activities = new_activity_data)
             
-            write_json(self.activity_data_file, new_data.model_dump(mode="json"))
+            for activity_id, activity in new_activity_data.items():
+                pending = self._pending_activities.get(activity_id)
+                if activity.weather is None and pending is not None:
+                    activity.weather = pending.weather
+            
+            self._pending_activities.update(new_activity_data)
+            self._commit()
             
-            log.debug(f"Updated data with activity ids: {set(new_data.activities)}")
-            log.debug(f"Saved to: {self.activity_data_file.as_posix()}")
+            log.debug(f"Updated data with activity ids: {set(new_activity_data)}")
             return "complete"
         except Exception as e:
             return str(e)
     
-    def update_zones(self, zones: Zones) -> str:
+    def update_activity_pages(
+        self,
+        pages: Iterable[List[Union[DetailedActivity, ActivityModel]]],
+        on_page: Optional[Callable[[List[Any]], None]] = None
+    ) -> str:
         """
-        Update JSON with new athlete zones.
+        Stores activities a page at a time as the pages arrive, so only one
+        page is held in memory and stored pages are kept if listing fails.
+        `on_page` is called w/ each page once it's stored.
         """
         try:
-            new_zones = AthleteZones.from_strava_zones(zones)
+            for page in pages:
+                callback = self.update_activities(page)
+                if callback != "complete": return callback
                 
-            try:
-                new_zone_data = load_json_n_validate(self.activity_data_file, AthleteData)
-                new_zone_data.zones = new_zones
-            except FileNotFoundError:
-                new_zone_data = AthleteData(zones=new_zones)
-            
-            write_json(self.activity_data_file, new_zone_data.model_dump(mode="json"))
+                self.flush()
+                if on_page: on_page(page)
+            return "complete"
+        except Exception as e:
+            return str(e)
+    
+    def update_zones(self, zones: Zones) -> str:
+        """
+        Update store with new athlete zones.
+        """
+        try:
+            self._pending_zones = AthleteZones.from_strava_zones(zones)
+            self._commit()
             
-            log.info(f"Zones saved to: {self.activity_data_file.as_posix()}")
+            log.info("Athlete zones saved.")
             return "complete"
         except Exception as e:
             return str(e)
     
     def update_stats(self, stats: AthleteStats) -> str:
         """
-        Update JSON with new athlete stats.
+        Update store with new athlete stats.
         """
         try:
-            new_stats = AthleteStatistics.from_strava_stats(stats)
-                
-            try:
-                new_stats_data = load_json_n_validate(self.activity_data_file, AthleteData)
-                new_stats_data.stats = new_stats
-            except FileNotFoundError:
-                new_stats_data = AthleteData(stats=new_stats)
+            self._pending_stats = AthleteStatistics.from_strava_stats(stats)
+            self._commit()
             
-            write_json(self.activity_data_file, new_stats_data.model_dump(mode="json"))
-            
-            log.info(f"Athlete stats saved to: {self.activity_data_file.as_posix()}")
+            log.info("Athlete stats saved.")
             return "complete"
         except Exception as e:
-            return str(e)
\ No newline at end of file
+            return str(e)
+    
+    def delete_activities(self, activity_ids: Union[int, List[int]]) -> None:
+        """
+        Removes activities (& any pending updates to them) from the store.
+        """
+        activity_ids = to_list(activity_ids)
+        for activity_id in activity_ids:
+            self._pending_activities.pop(activity_id, None)
+        self._build_rollups()
+        if self.rollups: self.rollups.begin(activity_ids)
+        self.store.delete_activities(activity_ids)
+        if self.rollups: self.rollups.delete(activity_ids)
+        log.debug(f"Deleted activity ids: {set(activity_ids)}")
+        return None
+    
+    def _build_rollups(self) -> None:
+        """
+        Builds the rollups from the stored activities the first time they're
+        used (or when the store changed), and applies writes that were
+        interrupted before reaching them.
+        """
+        if not self.rollups: return None
+        
+        source = self.store.identity
+        if not self.rollups.built_from(source):
+            self.rollups.rebuild(self.store.get_activities().values(), source)
+            return None
+        
+        pending = self.rollups.pending
+        if pending:
+            stored = self.store.get_activities_by_id(pending)
+            self.rollups.apply(stored.values())
+            self.rollups.delete(i for i in pending if i not in stored)
+            log.info(f"Applied {len(pending)} interrupted rollup updates.")
+        return None
+    
+    def get_rollup(
+        self,
+        dimension: str,
+        activity_types: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Returns the distance, moving time, elevation gain & count totals by
+        "week", "month", "year", "activity_type" or "shoes" (optionally only
+        of some activity types).
+        """
+        if not self.rollups: raise ValueError("Rollups are disabled.")
+        self.flush()
+        self._build_rollups()
+        return self.rollups.table(dimension, activity_types)
+    
+    def import_json(self, json_file: Union[str, Path]) -> None:
+        """
+        Replaces the store w/ the contents of a `strava_data.json` file.
+        """
+        self.flush()
+        data = load_json_n_validate(json_file, AthleteData)
+        self.store.save(data)
+        if self.rollups:
+            self.rollups.rebuild((data.activities or {}).values(), self.store.identity)
+        log.info(
+            f"Imported {len(data.activities or {})} activities from: "
+            f"{Path(json_file).as_posix()}"
+        )
+        return None
+    
+    def export_json(self, json_file: Union[str, Path]) -> None:
+        """
+        Writes the store to a file w/ the `strava_data.json` layout.
+        """
+        self.flush()
+        write_json(
+            json_file, self.store.load(), indent=STORAGE.get("json_indent"),
+            exclude=STORED_EXCLUDE
+        )
+        log.info(f"Exported data to: {Path(json_file).as_posix()}")
+        return None
+    
+    def export_columnar(
+        self,
+        output_dir: Optional[Union[str, Path]] = None,
+        file_format: str = "parquet"
+    ) -> Dict[str, int]:
+        """
+        Exports activities, splits & weather to year partitioned columnar
+        tables, w/ the zones & stats alongside (see ColumnarExporter).
+        """
+        self.flush()
+        data = self.store.load()
+        exporter = ColumnarExporter(output_dir, file_format)
+        return exporter.export(data.activities or {}, data)
\ No newline at end of file
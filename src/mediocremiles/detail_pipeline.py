@@ -0,0 +1,172 @@
+"""
+Contains the DetailPipeline model.
+"""
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from stravalib.model import SummaryActivity
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.strava_client import StravaClient
+from src.mediocremiles.data_processor import DataProcessor
+from utils import load_config
+
+
+log = logging.getLogger("app.detail_pipeline")
+
+
+CONFIGS = load_config()
+PIPELINE: Dict[str, Any] = CONFIGS.get("pipeline", {})
+
+# Marks the end of a stage's input.
+_DONE = object()
+
+
+
+@dataclass
+class PipelineResult:
+    completed: List[int] = field(default_factory=list)
+    failed: List[int] = field(default_factory=list)
+
+
+class DetailPipeline:
+    """
+    Fetches, converts & stores detailed activities in overlapping stages.
+    
+    Fetch workers get detailed activities from Strava, transform workers
+    convert them to ActivityModels, and a single writer stores them in a
+    DataProcessor session. Activities count as completed once the session
+    has flushed them to the store. Stages are connected by bounded queues,
+    so a slow stage blocks the ones feeding it. Fetch workers share the
+    client, and so its request scheduler.
+    """
+    def __init__(
+        self,
+        client: StravaClient,
+        processor: DataProcessor,
+        fetch_workers: Optional[int] = None,
+        transform_workers: Optional[int] = None,
+        queue_size: Optional[int] = None
+    ):
+        self.client = client
+        self.processor = processor
+        self.fetch_workers = fetch_workers or PIPELINE.get("fetch_workers", 2)
+        self.transform_workers = (
+            transform_workers or PIPELINE.get("transform_workers", 4))
+        self.queue_size = queue_size or PIPELINE.get("queue_size", 32)
+        
+        self._lock = threading.Lock()
+    
+    def run(
+        self,
+        activities: Iterable[Union[int, SummaryActivity, ActivityModel]],
+        on_complete: Optional[Callable[[int, bool], None]] = None
+    ) -> PipelineResult:
+        """
+        Runs activities (or activity ids) through the pipeline. `on_complete`
+        is called w/ each activity id & whether it was stored.
+        """
+        result = PipelineResult()
+        fetch_queue = queue.Queue(self.queue_size)
+        transform_queue = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+        # Ids given to the writer's session that haven't been flushed yet.
+        unflushed = set()
+        
+        def finish(activity_id: int, ok: bool) -> None:
+            with self._lock:
+                unflushed.discard(activity_id)
+                (result.completed if ok else result.failed).append(activity_id)
+            if on_complete: on_complete(activity_id, ok)
+            return None
+        
+        def stored(activity_ids: List[int]) -> None:
+            for activity_id in activity_ids:
+                finish(activity_id, True)
+            return None
+
+        def fetch() -> None:
+            while (activity := fetch_queue.get()) is not _DONE:
+                activity_id = getattr(activity, "id", activity)
+                try:
+                    detailed = self.client.get_detailed_activity(activity_id)
+                except Exception as e:
+                    log.exception(f"Error fetching activity {activity_id}: {e}")
+                    detailed = None
+
+                if detailed: transform_queue.put(detailed)
+                else: finish(activity_id, False)
+        
+        def transform() -> None:
+            while (detailed := transform_queue.get()) is not _DONE:
+                try:
+                    write_queue.put(ActivityModel.from_strava_activity(detailed))
+                except Exception as e:
+                    log.exception(f"Error converting activity {detailed.id}: {e}")
+                    finish(detailed.id, False)
+        
+        def write() -> None:
+            drained = False
+            try:
+                with self.processor.session():
+                    while (activity := write_queue.get()) is not _DONE:
+                        with self._lock:
+                            unflushed.add(activity.id)
+                        callback = self.processor.update_activities(activity)
+                        if callback != "complete":
+                            log.error(f"Error storing activity {activity.id}: {callback}")
+                            finish(activity.id, False)
+                    drained = True
+            except Exception as e:
+                # Fails what wasn't stored & keeps draining the queue, so the
+                # stages feeding it don't block.
+                log.exception(f"Error writing activities: {e}")
+                with self._lock:
+                    failed = list(unflushed)
+                for activity_id in failed:
+                    finish(activity_id, False)
+                while not drained:
+                    activity = write_queue.get()
+                    if activity is _DONE: drained = True
+                    else: finish(activity.id, False)
+
+        self.processor.flush_callbacks.append(stored)
+        fetchers = self._start(fetch, self.fetch_workers)
+        transformers = self._start(transform, self.transform_workers)
+        writers = self._start(write, 1)
+        
+        for activity in activities:
+            fetch_queue.put(activity)
+        
+        # Each stage is shut down once everything upstream has finished.
+        self._stop(fetchers, fetch_queue)
+        self._stop(transformers, transform_queue)
+        self._stop(writers, write_queue)
+        self.processor.flush_callbacks.remove(stored)
+
+        log.info(
+            f"Stored {len(result.completed)} detailed activities "
+            f"({len(result.failed)} failed)."
+        )
+        return result
+    
+    @staticmethod
+    def _start(target: Callable[[], None], n_workers: int) -> List[threading.Thread]:
+        threads = [
+            threading.Thread(target=target, daemon=True)
+            for _ in range(max(1, n_workers))
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+    
+    @staticmethod
+    def _stop(threads: List[threading.Thread], stage_queue: queue.Queue) -> None:
+        for _ in threads:
+            stage_queue.put(_DONE)
+        for thread in threads:
+            thread.join()
+        return None
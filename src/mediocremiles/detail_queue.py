@@ -0,0 +1,135 @@
+"""
+Contains the DetailQueue model.
+"""
+import os
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Union
+
+from src.mediocremiles.models.activity import ActivityModel
+from utils import load_config
+
+
+log = logging.getLogger("app.detail_queue")
+
+
+CONFIGS = load_config()
+
+
+
+class DetailQueue:
+    """
+    Durable queue of activity ids that still need detailed data.
+    
+    The queued ids are kept in a JSON file, and completed ids are appended to
+    a checkpoint file next to it as they are stored. A restarted backfill
+    only gets the ids that were not checkpointed. Both files are removed once
+    the queue is empty.
+    """
+    def __init__(self, queue_file: Optional[Union[str, Path]] = None):
+        self.queue_file = Path(
+            queue_file or CONFIGS["paths"]["detail_queue"]).resolve()
+        self.done_file = self.queue_file.with_suffix(".done")
+        
+        self._queued = self._read_queue()
+        self._remaining = set(self._queued) - self._read_done()
+    
+    @staticmethod
+    def needs_detail(activity: ActivityModel) -> bool:
+        """
+        Whether a stored activity only has summary data (summary activities
+        have no splits, calories or device).
+        """
+        return (
+            not activity.splits_standard
+            and activity.calories is None
+            and activity.device_name is None
+        )
+    
+    def exists(self) -> bool:
+        return self.queue_file.exists()
+    
+    def build(self, activities: Iterable[ActivityModel]) -> List[int]:
+        """
+        Replaces the queue w/ the stored activities that need detailed data.
+        """
+        self.clear()
+        ids = self.add(a.id for a in activities if self.needs_detail(a))
+        log.info(f"Queued {len(ids)} activities that need detailed data.")
+        return ids
+    
+    def add(self, activity_ids: Iterable[int]) -> List[int]:
+        """
+        Adds activity ids to the queue. Returns the remaining ids.
+        """
+        activity_ids = list(dict.fromkeys(activity_ids))
+        queued_ids = set(self._queued)
+        self._queued.extend(i for i in activity_ids if i not in queued_ids)
+        self._write_queue(self._queued)
+        
+        # Re-added ids need detailed data again.
+        self._remaining.update(activity_ids)
+        self._rewrite_done(set(self._queued) - self._remaining)
+        return self.remaining()
+    
+    def remaining(self) -> List[int]:
+        """
+        Returns the queued ids that have not been checkpointed, in order.
+        """
+        return [i for i in self._queued if i in self._remaining]
+    
+    def mark_done(self, activity_ids: Iterable[int]) -> None:
+        """
+        Checkpoints completed activity ids.
+        """
+        activity_ids = list(activity_ids)
+        if not activity_ids: return None
+        
+        with self.done_file.open("a") as f:
+            f.write("".join(f"{i}\n" for i in activity_ids))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._remaining.difference_update(activity_ids)
+        if not self._remaining:
+            log.info("All queued activities have detailed data.")
+            self.clear()
+        return None
+    
+    def clear(self) -> None:
+        """
+        Removes the queue & checkpoint files.
+        """
+        self.queue_file.unlink(missing_ok=True)
+        self.done_file.unlink(missing_ok=True)
+        self._queued, self._remaining = [], set()
+        return None
+    
+    def _read_queue(self) -> List[int]:
+        if not self.queue_file.exists(): return []
+        return json.loads(self.queue_file.read_text())["activity_ids"]
+    
+    def _write_queue(self, activity_ids: List[int]) -> None:
+        self.queue_file.parent.mkdir(exist_ok=True, parents=True)
+        tmp_file = self.queue_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({
+            "updated_at": datetime.now().isoformat(),
+            "activity_ids": activity_ids
+        }))
+        tmp_file.replace(self.queue_file)
+        return None
+    
+    def _read_done(self) -> Set[int]:
+        if not self.done_file.exists(): return set()
+        # A crash mid-write can leave a partial (unterminated) last line.
+        lines = self.done_file.read_text().split("\n")[:-1]
+        return {int(line) for line in lines if line.strip()}
+    
+    def _rewrite_done(self, activity_ids: Set[int]) -> None:
+        if not activity_ids:
+            self.done_file.unlink(missing_ok=True)
+            return None
+        self.done_file.write_text("".join(f"{i}\n" for i in activity_ids))
+        return None
@@ -2,15 +2,15 @@
 Contains the ActivityModel.
 """
 import pytz
-from datetime import datetime, timedelta
-from typing import Optional, Sequence, List
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 from pydantic import BaseModel, computed_field
-from stravalib.model import DetailedActivity, Split
+from stravalib.model import DetailedActivity
 
 from utils import convert_distance, convert_speed
-from src.mediocremiles.weather_processor import WeatherProcessor
 from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.models.split_arrays import SplitArrays
 
 
 
@@ -42,7 +42,7 @@ class ActivityModel(BaseModel):
     perceived_exertion: Optional[float] 
     suffer_score: Optional[int] 
     weighted_average_power: Optional[float] 
-    splits_standard: Optional[list]
+    splits_standard: Optional[SplitArrays]
     device_name: Optional[str]
     weather: Optional[Weather]
     
@@ -103,7 +103,7 @@ class ActivityModel(BaseModel):
     
     @computed_field
     @property
-    def starting_week(self) -> datetime:
+    def starting_week(self) -> date:
         week = self.start_date - timedelta(days=self.start_date.weekday())
         return week.date()
     
@@ -115,7 +115,8 @@ class ActivityModel(BaseModel):
     @classmethod
     def from_strava_activity(cls, strava_activity: DetailedActivity) -> 'ActivityModel':
         """
-        convert stravalib Activity to our model.
+        convert stravalib Activity to our model. Weather is added separately
+        (see WeatherEnricher).
         """
         # adjusting timezone of start_date.
         tz = pytz.timezone(
@@ -129,13 +130,10 @@ class ActivityModel(BaseModel):
             end_lat = strava_activity.end_latlng.lat
             end_lon = strava_activity.end_latlng.lon
         
-        weather_processor = WeatherProcessor()
-        start_lat = start_lon = weather =  None
+        start_lat = start_lon = None
         if getattr(strava_activity, "start_latlng"):
             start_lat = strava_activity.start_latlng.lat
             start_lon = strava_activity.start_latlng.lon
-            weather = weather_processor.get_hourly_conditions(
-                start_lat, start_lon, strava_activity.start_date)
             
         gear = getattr(strava_activity, 'gear', None)
         shoe = shoe_total = None
@@ -150,7 +148,7 @@ class ActivityModel(BaseModel):
             
         splits = getattr(strava_activity, 'splits_standard', None)
         if splits:
-            splits = Splits.from_strava_splits(splits)
+            splits = SplitArrays.from_strava_splits(splits)
         
         return cls(
             id=strava_activity.id,
@@ -182,77 +180,8 @@ class ActivityModel(BaseModel):
             weighted_average_power=getattr(strava_activity, 'weighted_average_watts', None),
             splits_standard=splits,
             device_name=getattr(strava_activity, 'device_name', None),
-            weather=weather
+            weather=None
         )
     
-    class Config:
-        orm_mode = True
-        
-        
-        
-class Splits(BaseModel):
-    split_average_speed: Optional[float]
-    split_distance: Optional[float]
-    split_elapsed_time: Optional[float]
-    split_elevation_difference: Optional[float]
-    split_moving_time: Optional[float]
-    split_pace_zone: Optional[int]
-    split: Optional[int]
-    split_average_heartrate: Optional[float]
-    split_average_grade_adjusted_speed: Optional[float]
-    
-    @computed_field
-    @property
-    def split_average_speed_kmh(self) -> Optional[float]:
-        if self.split_average_speed:
-            return convert_speed(self.split_average_speed, "km")
-        return None
-    
-    @computed_field
-    @property
-    def split_average_speed_mph(self) -> Optional[float]:
-        if self.split_average_speed:
-            return convert_speed(self.split_average_speed, "mi")
-        return None
-    
-    @computed_field
-    @property
-    def split_elevation_difference_ft(self) -> Optional[float]:
-        if self.split_elevation_difference:
-            return convert_distance(self.split_elevation_difference, "ft")
-        return None
-    
-    @computed_field
-    @property
-    def split_average_grade_adjusted_speed_kmh(self) -> Optional[float]:
-        if self.split_average_grade_adjusted_speed:
-            return convert_speed(self.split_average_grade_adjusted_speed, "km")
-        return None
-    
-    @computed_field
-    @property
-    def split_average_grade_adjusted_speed_mph(self) -> Optional[float]:
-        if self.split_average_grade_adjusted_speed:
-            return convert_speed(self.split_average_grade_adjusted_speed, "mi")
-        return None
-    
-    @classmethod
-    def from_strava_splits(cls, splits: Sequence[Split]) -> List['Splits']:
-        model_splits = []
-        for split in splits:
-            model_splits.append(cls(
-                split_average_speed=split.average_speed,
-                split_distance=split.distance,
-                split_elapsed_time=split.elapsed_time,
-                split_elevation_difference=split.elevation_difference,
-                split_moving_time=split.moving_time,
-                split_pace_zone=split.pace_zone,
-                split=split.split,
-                split_average_heartrate=split.average_heartrate,
-                split_average_grade_adjusted_speed=split.average_grade_adjusted_speed
-            ))
-        return model_splits
-    
-    
     class Config:
         orm_mode = True
\ No newline at end of file
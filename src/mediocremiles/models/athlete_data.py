@@ -1,20 +1,142 @@
 """
 Contains the AthleteData model.
 """
-from typing import Dict, Optional
+from typing import Any, Dict, Iterator, MutableMapping, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, SerializationInfo, field_serializer
 
 from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.weather import Weather
 from src.mediocremiles.models.athlete_zones import AthleteZones
 from src.mediocremiles.models.athlete_stats import AthleteStatistics
 
 
+# Marks files written by this tool, whose records can be trusted. Version 2
+# stores splits as columns (see SplitArrays) & version 3 leaves out computed
+# fields, so older files are rewritten.
+FORMAT_VERSION = 3
+
+# Computed fields (unit conversions, week & month) of activities & their
+# weather, left out of stored files. See `units` for computing them in bulk.
+STORED_EXCLUDE = {
+    "activities": {"__all__": {
+        **{name: True for name in ActivityModel.model_computed_fields},
+        "weather": {name: True for name in Weather.model_computed_fields}
+    }}
+}
+
+
+
+class LazyActivities(MutableMapping[int, ActivityModel]):
+    """
+    Activities by id, kept as raw JSON records & only validated into models
+    when accessed. Iteration, `len` & membership only use the ids.
+    
+    Untouched records from a `trusted` file (one this tool wrote) are written
+    back as is, w/out being validated or re-serialized. Records from other
+    files are all validated before they're written.
+    """
+    def __init__(self, records: Dict[Any, Dict[str, Any]], trusted: bool = False):
+        self.trusted = trusted
+        self._records: Dict[int, Optional[Dict[str, Any]]] = {
+            int(k): v for k, v in records.items()}
+        self._models: Dict[int, ActivityModel] = {}
+    
+    def __getitem__(self, activity_id: int) -> ActivityModel:
+        model = self._models.get(activity_id)
+        if model is None:
+            # Validation (in pydantic's core) is faster than model_construct.
+            model = ActivityModel.model_validate(self._records[activity_id])
+            self._models[activity_id] = model
+            self._records[activity_id] = None
+        return model
+    
+    def __setitem__(self, activity_id: int, activity: ActivityModel) -> None:
+        self._models[activity_id] = activity
+        self._records[activity_id] = None
+    
+    def set_record(self, activity_id: int, record: Dict[str, Any]) -> None:
+        """
+        Inserts or replaces an activity w/ its raw JSON record.
+        """
+        self._records[activity_id] = record
+        self._models.pop(activity_id, None)
+    
+    def __delitem__(self, activity_id: int) -> None:
+        del self._records[activity_id]
+        self._models.pop(activity_id, None)
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._records)
+    
+    def __len__(self) -> int:
+        return len(self._records)
+    
+    def __contains__(self, activity_id: object) -> bool:
+        return activity_id in self._records
+    
+    @property
+    def n_loaded(self) -> int:
+        return len(self._models)
+    
+    def dump(self) -> Dict[str, Any]:
+        """
+        Returns the activities by id for JSON output: the raw record of
+        untouched activities (validating them first, if not trusted), and
+        the model of the rest.
+        """
+        if not self.trusted:
+            for activity_id in self._records: self[activity_id]
+        return {
+            str(k): self._models.get(k, record)
+            for k, record in self._records.items()
+        }
+
 
 class AthleteData(BaseModel):
     """
     Wrapper for data models.
+    
+    `lazy` builds a view of a stored JSON document whose activities are only
+    turned into models when accessed (see LazyActivities).
     """
     activities: Optional[Dict[int, ActivityModel]] = None
     zones: Optional[AthleteZones] = None
-    stats: Optional[AthleteStatistics] = None
\ No newline at end of file
+    stats: Optional[AthleteStatistics] = None
+    format_version: Optional[int] = None
+    
+    @classmethod
+    def lazy(cls, document: Dict[str, Any]) -> "AthleteData":
+        """
+        Returns a view of a JSON document w/ lazily built activities.
+        """
+        trusted = document.get("format_version") == FORMAT_VERSION
+        activities = document.get("activities")
+        zones, stats = document.get("zones"), document.get("stats")
+        return cls.model_construct(
+            activities=(
+                LazyActivities(activities, trusted)
+                if activities is not None else None
+            ),
+            zones=AthleteZones.model_validate(zones) if zones else None,
+            stats=AthleteStatistics.model_validate(stats) if stats else None,
+            format_version=document.get("format_version")
+        )
+    
+    @field_serializer("activities", mode="wrap")
+    def _serialize_activities(
+        self, activities: Any, handler: Any, info: SerializationInfo
+    ) -> Any:
+        if isinstance(activities, LazyActivities):
+            if info.mode_is_json():
+                # Raw records are written as is, & models as usual (so
+                # `exclude` applies to them).
+                records = activities.dump()
+                models = {
+                    int(k): a for k, a in records.items()
+                    if isinstance(a, ActivityModel)
+                }
+                if models: records.update(handler(models))
+                return records
+            activities = dict(activities.items())
+        return handler(activities)
\ No newline at end of file
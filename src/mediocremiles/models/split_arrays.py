@@ -0,0 +1,173 @@
+"""
+Contains the SplitArrays model.
+"""
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+from pydantic_core import core_schema
+from stravalib.model import Split
+
+from utils import convert_distance, convert_speed
+
+
+# Stored split fields & their stravalib Split attributes.
+SPLIT_FIELDS = {
+    "split_average_speed": "average_speed",
+    "split_distance": "distance",
+    "split_elapsed_time": "elapsed_time",
+    "split_elevation_difference": "elevation_difference",
+    "split_moving_time": "moving_time",
+    "split_pace_zone": "pace_zone",
+    "split": "split",
+    "split_average_heartrate": "average_heartrate",
+    "split_average_grade_adjusted_speed": "average_grade_adjusted_speed"
+}
+
+# Integer fields store missing values as -1, float fields as NaN.
+INT_FIELDS = {"split_pace_zone", "split"}
+MISSING_INT = -1
+
+SPLIT_DTYPE = np.dtype([
+    (field, np.int32 if field in INT_FIELDS else np.float64)
+    for field in SPLIT_FIELDS
+])
+
+# Unit converted fields: (stored field, converter, unit).
+DERIVED_FIELDS = {
+    "split_average_speed_kmh": ("split_average_speed", convert_speed, "km"),
+    "split_average_speed_mph": ("split_average_speed", convert_speed, "mi"),
+    "split_elevation_difference_ft": ("split_elevation_difference", convert_distance, "ft"),
+    "split_average_grade_adjusted_speed_kmh": (
+        "split_average_grade_adjusted_speed", convert_speed, "km"),
+    "split_average_grade_adjusted_speed_mph": (
+        "split_average_grade_adjusted_speed", convert_speed, "mi")
+}
+
+
+
+class SplitArrays:
+    """
+    An activity's splits as one typed NumPy (structured) array, rather than
+    a model per split.
+    
+    Serialized w/ only the stored fields, as `{field: [values]}`. The unit
+    converted fields are computed for all splits at once by
+    `derived` (& are included by `to_frame`). Validates from that layout, or
+    from a list of split records (the older layout).
+    """
+    __slots__ = ("array",)
+    
+    def __init__(self, array: np.ndarray):
+        self.array = array
+    
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]]) -> "SplitArrays":
+        n_splits = max((len(v) for v in columns.values() if v is not None), default=0)
+        array = np.empty(n_splits, dtype=SPLIT_DTYPE)
+        for field in SPLIT_FIELDS:
+            values = columns.get(field) or [None] * n_splits
+            missing = MISSING_INT if field in INT_FIELDS else np.nan
+            array[field] = [missing if v is None else v for v in values]
+        return cls(array)
+    
+    @classmethod
+    def from_records(
+        cls, records: Sequence[Union[Dict[str, Any], BaseModel]]
+    ) -> "SplitArrays":
+        records = [
+            r.model_dump() if isinstance(r, BaseModel) else r for r in records]
+        return cls.from_columns({
+            field: [r.get(field) for r in records] for field in SPLIT_FIELDS})
+    
+    @classmethod
+    def from_strava_splits(cls, splits: Sequence[Split]) -> "SplitArrays":
+        return cls.from_columns({
+            field: [getattr(s, attr, None) for s in splits]
+            for field, attr in SPLIT_FIELDS.items()
+        })
+    
+    @classmethod
+    def concat(cls, splits: Sequence["SplitArrays"]) -> "SplitArrays":
+        if not splits: return cls(np.empty(0, dtype=SPLIT_DTYPE))
+        return cls(np.concatenate([s.array for s in splits]))
+    
+    def __len__(self) -> int:
+        return len(self.array)
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SplitArrays): return NotImplemented
+        return len(self) == len(other) and all(
+            np.array_equal(
+                self.array[f], other.array[f], equal_nan=f not in INT_FIELDS)
+            for f in SPLIT_FIELDS
+        )
+    
+    def __repr__(self) -> str:
+        return f"SplitArrays({len(self)} splits)"
+    
+    def derived(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the unit converted fields (NaN where the stored value is
+        missing or zero).
+        """
+        derived = {}
+        for name, (field, convert, unit) in DERIVED_FIELDS.items():
+            values = self.array[field]
+            derived[name] = np.where(values != 0, convert(values, unit), np.nan)
+        return derived
+    
+    def to_json(self) -> Dict[str, List[Any]]:
+        """
+        Returns the stored fields as lists, w/ None for missing values.
+        """
+        # One conversion of the rows, transposed, is faster than per field.
+        rows = self.array.tolist()
+        columns = dict(zip(SPLIT_FIELDS, map(list, zip(*rows))))
+        for field in SPLIT_FIELDS:
+            values = columns.setdefault(field, [])
+            if field in INT_FIELDS:
+                if MISSING_INT in values:
+                    columns[field] = [None if v == MISSING_INT else v for v in values]
+            elif any(v != v for v in values):
+                columns[field] = [None if v != v else v for v in values]
+        return columns
+    
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        Returns a dict of stored fields per split.
+        """
+        columns = self.to_json()
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+    
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns the stored & unit converted fields as a DataFrame (w/
+        nullable integer columns).
+        """
+        frame = {}
+        for field in SPLIT_FIELDS:
+            values = self.array[field]
+            if field in INT_FIELDS:
+                frame[field] = pd.arrays.IntegerArray(
+                    values.astype(np.int64), values == MISSING_INT)
+            else:
+                frame[field] = values
+        frame.update(self.derived())
+        return pd.DataFrame(frame)
+    
+    @classmethod
+    def validate(cls, value: Any) -> "SplitArrays":
+        if isinstance(value, cls): return value
+        if isinstance(value, dict): return cls.from_columns(value)
+        if isinstance(value, (list, tuple)): return cls.from_records(value)
+        raise ValueError(f"Can't build splits from: {type(value).__name__}")
+    
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: Any) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda splits: splits.to_json())
+        )
@@ -0,0 +1,299 @@
+"""
+Contains the ResponseCache model.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils import load_config
+
+
+log = logging.getLogger("app.response_cache")
+
+
+CONFIGS = load_config()
+HTTP_CACHE: Dict[str, Any] = CONFIGS.get("http_cache", {})
+
+# Endpoint families, matched against the request path.
+FAMILIES = {
+    "zones": re.compile(r"/athlete/zones$"),
+    "stats": re.compile(r"/athletes/\d+/stats$"),
+    "athlete": re.compile(r"/athlete$"),
+    "activity": re.compile(r"/activities/(\d+)$"),
+    "activities": re.compile(r"/athlete/activities$")
+}
+
+# Hours responses are served w/out revalidation (None: until invalidated).
+DEFAULT_TTL_HOURS = {
+    "zones": 7 * 24,
+    "stats": 6,
+    "athlete": 24,
+    "activity": None,
+    "activities": 0
+}
+
+# Hours activity listings are kept after they were last stored or revalidated.
+# Listing params (dates & pages) vary between syncs, so they'd pile up otherwise.
+DEFAULT_LISTING_MAX_AGE_HOURS = 30 * 24
+
+# Summary fields that a cached detailed activity must still match.
+FINGERPRINT_FIELDS = [
+    "name", "sport_type", "start_date", "distance", "moving_time",
+    "elapsed_time", "total_elevation_gain", "workout_type", "gear_id",
+    "kudos_count"
+]
+
+# Per-request headers that must not be replayed from the cache.
+RATE_LIMIT_HEADERS = re.compile(r"^x-(read)?ratelimit-", re.IGNORECASE)
+
+
+
+def _fingerprint(activity: Dict[str, Any]) -> str:
+    return json.dumps([activity.get(f) for f in FINGERPRINT_FIELDS])
+
+
+@dataclass
+class CachedResponse:
+    family: str
+    headers: Dict[str, str]
+    body: bytes
+    stored_at: float
+    
+    @property
+    def validators(self) -> Dict[str, str]:
+        """
+        Conditional request headers for revalidating the response.
+        """
+        headers = CaseInsensitiveDict(self.headers)
+        validators = {}
+        if "ETag" in headers:
+            validators["If-None-Match"] = headers["ETag"]
+        if "Last-Modified" in headers:
+            validators["If-Modified-Since"] = headers["Last-Modified"]
+        return validators
+    
+    def to_response(
+        self,
+        request: Optional[requests.PreparedRequest] = None,
+        live: Optional[requests.Response] = None
+    ) -> requests.Response:
+        """
+        Returns the cached body as a 200 response (w/ a revalidating
+        response's headers, if given).
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body
+        response.headers = CaseInsensitiveDict(self.headers)
+        if live is not None:
+            response.headers.update(live.headers)
+            response.url, response.request = live.url, live.request
+        elif request is not None:
+            response.url, response.request = request.url, request
+        response.encoding = "utf-8"
+        return response
+
+
+class ResponseCache:
+    """
+    On-disk cache of Strava API GET responses.
+    
+    Responses are stored w/ their ETag & Last-Modified headers, and served
+    w/out a request until their endpoint family's TTL has passed. After that
+    they're revalidated w/ a conditional request. Detailed activities don't
+    expire, but are dropped when an activity listing shows the activity's
+    summary fields have changed. Activity listings are evicted once they
+    haven't been stored or revalidated for `listing_max_age_hours`. In
+    `offline` mode only cached responses are served, and uncached requests
+    fail.
+    """
+    def __init__(
+        self,
+        path: Union[str, Path],
+        offline: Optional[bool] = None,
+        ttl_hours: Optional[Dict[str, Optional[float]]] = None,
+        listing_max_age_hours: Optional[float] = None
+    ):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.offline = HTTP_CACHE.get("offline", False) if offline is None else offline
+        self.ttl_hours = {
+            **DEFAULT_TTL_HOURS, **HTTP_CACHE.get("ttl_hours", {}), **(ttl_hours or {})}
+        self.listing_max_age_hours = listing_max_age_hours or HTTP_CACHE.get(
+            "listing_max_age_hours", DEFAULT_LISTING_MAX_AGE_HOURS)
+        
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                family TEXT NOT NULL,
+                activity_id INTEGER,
+                fingerprint TEXT,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_activity_id "
+            "ON responses (activity_id)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_family "
+            "ON responses (family, stored_at)"
+        )
+        self.conn.commit()
+    
+    @staticmethod
+    def family(url: str) -> Optional[str]:
+        """
+        Returns the endpoint family of an API url (None if not cached).
+        """
+        path = requests.utils.urlparse(url).path.rstrip("/")
+        for family, pattern in FAMILIES.items():
+            if pattern.search(path): return family
+        return None
+    
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Returns the cache key (the url w/ its params, minus the token).
+        """
+        params = {k: v for k, v in (params or {}).items() if k != "access_token"}
+        return requests.Request("GET", url, params=params).prepare().url
+    
+    def is_fresh(self, cached: CachedResponse) -> bool:
+        ttl = self.ttl_hours.get(cached.family)
+        if ttl is None: return True
+        return time.time() - cached.stored_at < ttl * 3600
+    
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT family, headers, body, stored_at FROM responses "
+                "WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None: return None
+        return CachedResponse(row[0], json.loads(row[1]), row[2], row[3])
+    
+    def put(self, key: str, response: requests.Response) -> None:
+        """
+        Caches a 200 response.
+        """
+        family = self.family(key)
+        headers = {
+            k: v for k, v in response.headers.items()
+            if not RATE_LIMIT_HEADERS.match(k)
+        }
+        
+        activity_id = fingerprint = None
+        if family == "activity":
+            activity = response.json()
+            activity_id, fingerprint = activity.get("id"), _fingerprint(activity)
+        
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, family, activity_id, fingerprint, json.dumps(headers),
+                 response.content, time.time())
+            )
+        if family == "activities":
+            self.invalidate_changed(response.json())
+            self.evict_listings()
+        return None
+    
+    def touch(self, key: str) -> None:
+        """
+        Marks a revalidated response as fresh.
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?",
+                (time.time(), key)
+            )
+        return None
+    
+    def invalidate_changed(self, activities: Iterable[Dict[str, Any]]) -> int:
+        """
+        Drops cached detailed activities whose summary fields differ from the
+        listed activities. Returns the number dropped.
+        """
+        fingerprints = {a["id"]: _fingerprint(a) for a in activities if "id" in a}
+        if not fingerprints: return 0
+        
+        with self._lock, self.conn:
+            ids = list(fingerprints)
+            rows = self.conn.execute(
+                "SELECT key, activity_id, fingerprint FROM responses "
+                f"WHERE activity_id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()
+            stale = [key for key, i, f in rows if fingerprints[i] != f]
+            self.conn.executemany(
+                "DELETE FROM responses WHERE key = ?", [(k,) for k in stale])
+        
+        if stale: log.debug(f"Dropped {len(stale)} changed detailed activities.")
+        return len(stale)
+    
+    def evict_listings(self) -> int:
+        """
+        Drops activity listings older than `listing_max_age_hours`. Returns
+        the number dropped.
+        """
+        cutoff = time.time() - self.listing_max_age_hours * 3600
+        with self._lock, self.conn:
+            evicted = self.conn.execute(
+                "DELETE FROM responses WHERE family = 'activities' "
+                "AND stored_at < ?", (cutoff,)
+            ).rowcount
+        
+        if evicted: log.debug(f"Evicted {evicted} old activity listings.")
+        return evicted
+    
+    def clear(self) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+        return None
+    
+    def request(
+        self,
+        send: Callable[[Optional[Dict[str, str]]], requests.Response],
+        url: str,
+        params: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]]
+    ) -> requests.Response:
+        """
+        Serves a GET request from the cache, or sends it w/ `send(headers)`
+        (revalidating a stale response) & caches the result.
+        """
+        key = self.key(url, params)
+        cached = self.get(key)
+        request = requests.Request("GET", key).prepare()
+        
+        if cached is not None and (self.offline or self.is_fresh(cached)):
+            return cached.to_response(request)
+        if self.offline:
+            raise requests.ConnectionError(f"Offline, and no cached response for: {key}")
+        
+        if cached is not None:
+            headers = {**(headers or {}), **cached.validators}
+        response = send(headers)
+        
+        if response.status_code == 304 and cached is not None:
+            self.touch(key)
+            return cached.to_response(live=response)
+        if response.status_code == 200:
+            self.put(key, response)
+        return response
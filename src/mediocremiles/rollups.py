@@ -0,0 +1,254 @@
+"""
+Contains the Rollups model.
+"""
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from src.mediocremiles.models.activity import ActivityModel
+
+
+log = logging.getLogger("app.rollups")
+
+
+# Dimensions activities are rolled up by.
+DIMENSIONS = ["week", "month", "year", "activity_type", "shoes"]
+
+# Summed activity fields (w/ the rollup columns they're summed into).
+MEASURES = {
+    "distance_meters": "total_distance_meters",
+    "moving_time_seconds": "total_moving_time_seconds",
+    "elevation_gain_meters": "total_elevation_gain_meters"
+}
+
+# An activity's (type, dimension keys, measures).
+Contribution = Tuple[str, Dict[str, Optional[str]], List[float]]
+
+
+
+def contribution(activity: ActivityModel) -> Contribution:
+    """
+    Returns what an activity adds to the rollups. Weeks & months are in the
+    activity's local time, like `starting_week` & `month`.
+    """
+    start = activity.start_date
+    keys = {
+        "week": activity.starting_week.isoformat() if start else None,
+        "month": f"{start.year:04d}-{start.month:02d}" if start else None,
+        "year": f"{start.year:04d}" if start else None,
+        "activity_type": activity.activity_type,
+        "shoes": activity.shoes
+    }
+    measures = [getattr(activity, field) or 0.0 for field in MEASURES.values()]
+    return activity.activity_type or "", keys, measures
+
+
+class Rollups:
+    """
+    Materialized distance, moving time, elevation gain & count totals by
+    week, month, year, activity type & shoes, kept in SQLite.
+    
+    Totals are kept per activity type, and each activity's contribution is
+    stored, so inserting, replacing or deleting an activity only applies the
+    difference to its rows. `table` reads a dimension's totals w/out touching
+    the activities.
+    
+    The rollups record the store they were built from (see `built_from`).
+    Ids about to be written to the store are recorded by `begin` until
+    they're applied, so a write interrupted between the store & the rollups
+    can be applied again (applying is idempotent).
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        measure_cols = ",\n".join(f"{name} REAL NOT NULL" for name in MEASURES)
+        key_cols = ",\n".join(f"{name} TEXT" for name in DIMENSIONS)
+        with self.conn:
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    dimension TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    activity_type TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    {measure_cols},
+                    PRIMARY KEY (dimension, key, activity_type)
+                );
+                
+                CREATE TABLE IF NOT EXISTS contributions (
+                    activity_id INTEGER PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    {key_cols},
+                    {measure_cols}
+                );
+                
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                
+                CREATE TABLE IF NOT EXISTS pending (
+                    activity_id INTEGER PRIMARY KEY
+                );
+            """)
+    
+    def built_from(self, source: str) -> bool:
+        """
+        Whether the rollups have been built from the given store (see
+        `BaseStore.identity`).
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row is not None and row[0] == source
+    
+    @property
+    def pending(self) -> List[int]:
+        """
+        Ids recorded by `begin` that haven't been applied or deleted since.
+        """
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT activity_id FROM pending")]
+    
+    def begin(self, activity_ids: Iterable[int]) -> None:
+        """
+        Records ids that are about to be written to the store.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO pending VALUES (?)",
+                [(activity_id,) for activity_id in activity_ids]
+            )
+        return None
+    
+    def _done(self, activity_ids: Iterable[int]) -> None:
+        self.conn.executemany(
+            "DELETE FROM pending WHERE activity_id = ?",
+            [(activity_id,) for activity_id in activity_ids]
+        )
+        return None
+    
+    def _add(self, c: Contribution, sign: int) -> None:
+        """
+        Adds (or w/ `sign` -1, subtracts) a contribution. Runs in the
+        caller's transaction.
+        """
+        activity_type, keys, measures = c
+        updates = ", ".join(
+            f"{name} = {name} + excluded.{name}" for name in ["count", *MEASURES])
+        self.conn.executemany(
+            f"INSERT INTO rollups VALUES ({', '.join('?' * (4 + len(MEASURES)))}) "
+            f"ON CONFLICT (dimension, key, activity_type) DO UPDATE SET {updates}",
+            [
+                (dimension, key, activity_type, sign, *(sign * m for m in measures))
+                for dimension, key in keys.items() if key is not None
+            ]
+        )
+        return None
+    
+    def _stored(self, activity_id: int) -> Optional[Contribution]:
+        row = self.conn.execute(
+            "SELECT * FROM contributions WHERE activity_id = ?", (activity_id,)
+        ).fetchone()
+        if row is None: return None
+        n_keys = len(DIMENSIONS)
+        return row[1], dict(zip(DIMENSIONS, row[2:2 + n_keys])), list(row[2 + n_keys:])
+    
+    def _apply(self, activities: Iterable[ActivityModel]) -> int:
+        n_applied = 0
+        applied_ids = []
+        for activity in activities:
+            applied_ids.append(activity.id)
+            new = contribution(activity)
+            old = self._stored(activity.id)
+            if old == new: continue
+            if old is not None: self._add(old, -1)
+            self._add(new, 1)
+            activity_type, keys, measures = new
+            self.conn.execute(
+                "INSERT OR REPLACE INTO contributions "
+                f"VALUES ({', '.join('?' * (2 + len(DIMENSIONS) + len(MEASURES)))})",
+                (activity.id, activity_type, *keys.values(), *measures)
+            )
+            n_applied += 1
+        self.conn.execute("DELETE FROM rollups WHERE count <= 0")
+        self._done(applied_ids)
+        return n_applied
+    
+    def apply(self, activities: Iterable[ActivityModel]) -> None:
+        """
+        Adds inserted activities, & the change to replaced ones.
+        """
+        with self._lock, self.conn:
+            n_applied = self._apply(activities)
+        if n_applied: log.debug(f"Rolled up {n_applied} activities.")
+        return None
+    
+    def delete(self, activity_ids: Iterable[int]) -> None:
+        """
+        Subtracts deleted activities.
+        """
+        activity_ids = list(activity_ids)
+        with self._lock, self.conn:
+            for activity_id in activity_ids:
+                old = self._stored(activity_id)
+                if old is None: continue
+                self._add(old, -1)
+                self.conn.execute(
+                    "DELETE FROM contributions WHERE activity_id = ?", (activity_id,))
+            self.conn.execute("DELETE FROM rollups WHERE count <= 0")
+            self._done(activity_ids)
+        return None
+    
+    def rebuild(self, activities: Iterable[ActivityModel], source: str) -> None:
+        """
+        Replaces the rollups w/ those of all the activities of a store (see
+        `built_from`).
+        """
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM rollups")
+            self.conn.execute("DELETE FROM contributions")
+            self.conn.execute("DELETE FROM pending")
+            n_applied = self._apply(activities)
+            self.conn.execute("DELETE FROM meta WHERE key = 'built'")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (source,))
+        log.info(f"Rebuilt rollups of {n_applied} activities.")
+        return None
+    
+    def table(
+        self,
+        dimension: str,
+        activity_types: Optional[Iterable[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Returns the totals by a dimension (e.g. "week"), optionally only of
+        some activity types, sorted by key.
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown rollup dimension: {dimension}")
+        
+        sums = ", ".join(f"SUM({name}) AS {name}" for name in ["count", *MEASURES])
+        params: List[str] = [dimension]
+        where = "WHERE dimension = ?"
+        if activity_types is not None:
+            activity_types = list(activity_types)
+            where += f" AND activity_type IN ({', '.join('?' * len(activity_types))})"
+            params.extend(activity_types)
+        
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT key AS {dimension}, {sums} FROM rollups {where} "
+                "GROUP BY key ORDER BY key",
+                self.conn, params=params
+            )
+    
+    def close(self) -> None:
+        self.conn.close()
+        return None
@@ -0,0 +1,134 @@
+"""
+Contains the BaseStore model.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.athlete_zones import AthleteZones
+from src.mediocremiles.models.athlete_stats import AthleteStatistics
+from src.mediocremiles.models.athlete_data import AthleteData
+from utils import to_utc
+
+
+
+class BaseStore(ABC):
+    """
+    Base model for athlete data storage backends.
+    
+    Subclasses must implement `load` & `save`. The remaining methods fall back
+    to a full load/save and should be overridden where the backend can do
+    better.
+    """
+    @property
+    def identity(self) -> str:
+        """
+        Identifies the stored data (backend & location), so data derived from
+        it (e.g. Rollups) can tell when the store changed.
+        """
+        return type(self).__name__
+    
+    @abstractmethod
+    def load(self) -> AthleteData:
+        """
+        Returns all stored athlete data (empty if nothing is stored).
+        """
+        pass
+    
+    @abstractmethod
+    def save(self, data: AthleteData) -> None:
+        """
+        Replaces all stored athlete data.
+        """
+        pass
+    
+    def upsert_activities(self, activities: Dict[int, ActivityModel]) -> None:
+        """
+        Inserts or replaces activities by id. Activities w/out weather keep
+        the weather already stored for them.
+        """
+        data = self.load()
+        if data.activities is None:
+            data.activities = {}
+        for activity_id, activity in activities.items():
+            stored = data.activities.get(activity_id)
+            if activity.weather is None and stored is not None:
+                activity.weather = stored.weather
+            data.activities[activity_id] = activity
+        self.save(data)
+        return None
+    
+    def delete_activities(self, activity_ids: Iterable[int]) -> None:
+        """
+        Removes activities by id (ids not stored are ignored).
+        """
+        data = self.load()
+        for activity_id in activity_ids:
+            (data.activities or {}).pop(activity_id, None)
+        self.save(data)
+        return None
+    
+    def save_zones(self, zones: AthleteZones) -> None:
+        """
+        Replaces the stored athlete zones.
+        """
+        data = self.load()
+        data.zones = zones
+        self.save(data)
+        return None
+    
+    def save_stats(self, stats: AthleteStatistics) -> None:
+        """
+        Replaces the stored athlete stats.
+        """
+        data = self.load()
+        data.stats = stats
+        self.save(data)
+        return None
+    
+    def get_activities(
+        self,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None
+    ) -> Dict[int, ActivityModel]:
+        """
+        Returns stored activities, optionally within a start date range.
+        """
+        activities = self.load().activities or {}
+        return {
+            k: a for k, a in activities.items()
+            if self.in_range(a.start_date, after, before)
+        }
+    
+    def get_activities_by_id(
+        self, activity_ids: Iterable[int]
+    ) -> Dict[int, ActivityModel]:
+        """
+        Returns the stored activities of the given ids (ids not stored are
+        ignored).
+        """
+        activities = self.load().activities or {}
+        return {i: activities[i] for i in activity_ids if i in activities}
+    
+    @staticmethod
+    def in_range(
+        date: datetime,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None
+    ) -> bool:
+        """
+        Returns whether a date is strictly between `after` & `before`.
+        """
+        return (
+            not (after and to_utc(date) <= to_utc(after))
+            and not (before and to_utc(date) >= to_utc(before))
+        )
+    
+    def latest_activity_date(self) -> Optional[datetime]:
+        """
+        Returns the start date of the most recent stored activity.
+        """
+        activities = self.load().activities
+        if not activities: return None
+        return max(a.start_date for a in activities.values())
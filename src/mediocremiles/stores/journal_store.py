@@ -0,0 +1,202 @@
+"""
+Contains the JournalStore model.
+"""
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.athlete_zones import AthleteZones
+from src.mediocremiles.models.athlete_stats import AthleteStatistics
+from src.mediocremiles.models.athlete_data import (
+    AthleteData, LazyActivities, FORMAT_VERSION, STORED_EXCLUDE)
+from src.mediocremiles.stores.json_store import JSONStore
+from utils import load_json, write_json, type_adapter, orjson
+
+
+log = logging.getLogger("app.stores.journal")
+
+
+DEFAULT_MAX_MB = 16
+DEFAULT_MAX_AGE_HOURS = 24
+
+
+
+class JournalStore(JSONStore):
+    """
+    Stores athlete data as a JSON snapshot plus an append-only journal.
+    
+    The snapshot has the `strava_data.json` layout. Activity, zones & stats
+    updates & deletes are appended to `<snapshot>.journal` as one line each
+    (a partial `strava_data.json` document, or the `deleted_activities` ids)
+    & fsynced, so a write costs the size of the update, not of the store.
+    Loading replays the journal over the snapshot, and a torn last line from
+    an interrupted write is ignored.
+    
+    Once the journal reaches `max_mb`, or the snapshot is `max_age_hours` old,
+    the journal is compacted: the merged data is written to a new snapshot
+    that atomically replaces the old one, then the journal is removed.
+    Replaying the journal again after a crash mid-compaction is harmless, as
+    every entry replaces by key.
+    """
+    def __init__(
+        self,
+        path: Union[str, Path],
+        indent: Optional[int] = None,
+        max_mb: Optional[float] = None,
+        max_age_hours: Optional[float] = None,
+        compression: Optional[str] = None
+    ):
+        super().__init__(path, indent, compression)
+        self.journal_path = self.path.with_name(f"{self.path.name}.journal")
+        self.max_bytes = (max_mb or DEFAULT_MAX_MB) * 1024 ** 2
+        self.max_age = (max_age_hours or DEFAULT_MAX_AGE_HOURS) * 3600
+        # Bytes of the journal replayed into the in-memory data.
+        self._offset = 0
+    
+    def _journal_size(self) -> int:
+        try:
+            return self.journal_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+    
+    def load(self) -> AthleteData:
+        mtime = self._file_mtime()
+        if (
+            self._data is None or mtime != self._mtime
+            or self._journal_size() < self._offset
+        ):
+            if mtime is None:
+                data = AthleteData()
+            else:
+                data = AthleteData.lazy(load_json(self.path))
+            self._data, self._mtime, self._offset = data, mtime, 0
+        
+        self._replay()
+        return self._data
+    
+    def _replay(self) -> None:
+        """
+        Applies the journal entries appended since the last replay.
+        """
+        if self._journal_size() <= self._offset: return None
+        
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        # A last line w/out a newline is an interrupted write.
+        end = chunk.rfind(b"\n") + 1
+        
+        n_entries = 0
+        for line in chunk[:end].splitlines():
+            try:
+                entry = orjson.loads(line) if orjson else json.loads(line)
+            except ValueError as e:
+                log.warning(f"Skipping unreadable journal entry: {e}")
+                continue
+            self._apply(entry)
+            n_entries += 1
+        
+        self._offset += end
+        log.debug(f"Replayed {n_entries} journal entries.")
+        return None
+    
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        """
+        Merges a journal entry into the in-memory data.
+        """
+        data = self._data
+        if entry.get("activities"):
+            if data.activities is None:
+                data.activities = LazyActivities({}, trusted=True)
+            for activity_id, record in entry["activities"].items():
+                if isinstance(data.activities, LazyActivities):
+                    data.activities.set_record(int(activity_id), record)
+                else:
+                    data.activities[int(activity_id)] = ActivityModel.model_validate(record)
+        for activity_id in entry.get("deleted_activities", []):
+            (data.activities or {}).pop(activity_id, None)
+        if entry.get("zones"):
+            data.zones = AthleteZones.model_validate(entry["zones"])
+        if entry.get("stats"):
+            data.stats = AthleteStatistics.model_validate(entry["stats"])
+        return None
+    
+    def _append(self, entry: Dict[str, Any]) -> None:
+        """
+        Appends an entry (models are dumped as JSON) to the journal, then
+        compacts if due.
+        """
+        line = type_adapter(Dict[str, Any]).dump_json(
+            entry, exclude=STORED_EXCLUDE) + b"\n"
+        
+        # Drops a torn last line, so the entry starts on its own line.
+        if self._journal_size() > self._offset:
+            os.truncate(self.journal_path, self._offset)
+        with open(self.journal_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._offset += len(line)
+        
+        if self._offset >= self.max_bytes or self._snapshot_age() >= self.max_age:
+            self.compact()
+        return None
+    
+    def _snapshot_age(self) -> float:
+        if self._mtime is None: return float("inf")
+        return time.time() - self._mtime / 1e9
+    
+    def upsert_activities(self, activities: Dict[int, ActivityModel]) -> None:
+        data = self.load()
+        if data.activities is None:
+            data.activities = LazyActivities({}, trusted=True)
+        for activity_id, activity in activities.items():
+            stored = data.activities.get(activity_id)
+            if activity.weather is None and stored is not None:
+                activity.weather = stored.weather
+            data.activities[activity_id] = activity
+        self._append({"activities": activities})
+        return None
+    
+    def delete_activities(self, activity_ids: Iterable[int]) -> None:
+        activities = self.load().activities or {}
+        deleted = [i for i in activity_ids if activities.pop(i, None) is not None]
+        if deleted: self._append({"deleted_activities": deleted})
+        return None
+    
+    def save_zones(self, zones: AthleteZones) -> None:
+        self.load().zones = zones
+        self._append({"zones": zones})
+        return None
+    
+    def save_stats(self, stats: AthleteStatistics) -> None:
+        self.load().stats = stats
+        self._append({"stats": stats})
+        return None
+    
+    def save(self, data: AthleteData) -> None:
+        """
+        Replaces all stored athlete data w/ a new snapshot & an empty journal.
+        """
+        data.format_version = FORMAT_VERSION
+        write_json(
+            self.path, data, indent=self.indent, fsync=True,
+            exclude=STORED_EXCLUDE, compression=self.compression
+        )
+        self.journal_path.unlink(missing_ok=True)
+        self._data, self._mtime, self._offset = data, self._file_mtime(), 0
+        log.debug(f"Saved to: {self.path.as_posix()}")
+        return None
+    
+    def compact(self) -> None:
+        """
+        Merges the journal into a new snapshot.
+        """
+        n_bytes = self._journal_size()
+        self.save(self.load())
+        log.info(f"Compacted {n_bytes / 1024:.0f}KB journal into: {self.path.as_posix()}")
+        return None
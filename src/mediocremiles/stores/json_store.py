@@ -0,0 +1,71 @@
+"""
+Contains the JSONStore model.
+"""
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+from src.mediocremiles.models.athlete_data import AthleteData, FORMAT_VERSION, STORED_EXCLUDE
+from src.mediocremiles.stores.base import BaseStore
+from utils import load_json, write_json
+
+
+log = logging.getLogger("app.stores.json")
+
+
+
+class JSONStore(BaseStore):
+    """
+    Stores all athlete data in a single JSON document.
+    
+    The document is kept in memory and only re-read if the file changes on
+    disk. Activities are only validated when accessed (see LazyActivities),
+    so reads & small updates don't build every activity. The file is
+    written compactly, unless an `indent` is given, w/out the activities'
+    computed fields, & optionally gzip or zstd compressed (compressed files
+    are detected when read).
+    """
+    def __init__(
+        self,
+        path: Union[str, Path],
+        indent: Optional[int] = None,
+        compression: Optional[str] = None
+    ):
+        self.path = Path(path).resolve()
+        self.indent = indent
+        self.compression = compression
+        self._data: Optional[AthleteData] = None
+        self._mtime: Optional[float] = None
+    
+    @property
+    def identity(self) -> str:
+        return f"{type(self).__name__}:{self.path.as_posix()}"
+    
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def load(self) -> AthleteData:
+        mtime = self._file_mtime()
+        if self._data is not None and mtime == self._mtime:
+            return self._data
+        
+        if mtime is None:
+            data = AthleteData()
+        else:
+            data = AthleteData.lazy(load_json(self.path))
+        
+        self._data, self._mtime = data, mtime
+        return data
+    
+    def save(self, data: AthleteData) -> None:
+        data.format_version = FORMAT_VERSION
+        write_json(
+            self.path, data, indent=self.indent, exclude=STORED_EXCLUDE,
+            compression=self.compression
+        )
+        self._data, self._mtime = data, self._file_mtime()
+        log.debug(f"Saved to: {self.path.as_posix()}")
+        return None
@@ -0,0 +1,259 @@
+"""
+Contains the ShardedStore model.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.athlete_zones import AthleteZones
+from src.mediocremiles.models.athlete_stats import AthleteStatistics
+from src.mediocremiles.models.athlete_data import AthleteData, FORMAT_VERSION
+from src.mediocremiles.stores.base import BaseStore
+from src.mediocremiles.stores.json_store import JSONStore
+from utils import load_json, write_json, to_utc
+
+
+log = logging.getLogger("app.stores.sharded")
+
+
+
+def shard_key(date: datetime) -> str:
+    """
+    Returns the shard ("YYYY-MM", in UTC) of an activity start date.
+    """
+    date = to_utc(date)
+    return f"{date.year:04d}-{date.month:02d}"
+
+
+def shard_bounds(key: str) -> Tuple[datetime, datetime]:
+    """
+    Returns the (UTC) start of a shard's month & of the next month.
+    """
+    year, month = map(int, key.split("-"))
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+class ShardedStore(BaseStore):
+    """
+    Stores activities in one JSON file per start month.
+    
+    Activities are kept in `activities/YYYY-MM.json` files (each w/ the
+    `strava_data.json` layout), zones & stats in `athlete.json`, and
+    `manifest.json` lists the activity ids in each shard. Upserts only read
+    & rewrite the shards of the activities given, and date range queries
+    only open the shards overlapping the range.
+    
+    The manifest is written after the shards, so a missing manifest, or one
+    older than a shard (from a write interrupted in between), is rebuilt
+    from the shards.
+    """
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        indent: Optional[int] = None,
+        compression: Optional[str] = None
+    ):
+        self.directory = Path(directory).resolve()
+        self.indent = indent
+        self.compression = compression
+        self.manifest_path = self.directory / "manifest.json"
+        self.athlete = JSONStore(self.directory / "athlete.json", indent, compression)
+        self._shards: Dict[str, JSONStore] = {}
+        self._manifest: Optional[Dict[int, str]] = None
+    
+    @property
+    def identity(self) -> str:
+        return f"{type(self).__name__}:{self.directory.as_posix()}"
+    
+    def _shard(self, key: str) -> JSONStore:
+        if key not in self._shards:
+            self._shards[key] = JSONStore(
+                self.directory / "activities" / f"{key}.json",
+                self.indent, self.compression
+            )
+        return self._shards[key]
+    
+    @property
+    def manifest(self) -> Dict[int, str]:
+        """
+        The shard of each stored activity id.
+        """
+        if self._manifest is None:
+            if self._manifest_is_current():
+                self._manifest = {
+                    int(i): key
+                    for key, ids in load_json(self.manifest_path)["shards"].items()
+                    for i in ids
+                }
+            else:
+                self._manifest = self._scan()
+                if self._manifest: self._write_manifest()
+        return self._manifest
+    
+    def _manifest_is_current(self) -> bool:
+        """
+        Whether the manifest exists & was written after every shard.
+        """
+        try:
+            written = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        return all(
+            path.stat().st_mtime_ns <= written
+            for path in self.directory.glob("activities/*.json")
+        )
+    
+    def _scan(self) -> Dict[int, str]:
+        """
+        Rebuilds the manifest from the shard files.
+        """
+        manifest = {}
+        for path in sorted(self.directory.glob("activities/*.json")):
+            activities = self._shard(path.stem).load().activities or {}
+            manifest.update((i, path.stem) for i in activities)
+        if manifest: log.info(f"Rebuilt manifest of {len(manifest)} activities.")
+        return manifest
+    
+    def _write_manifest(self) -> None:
+        shards = defaultdict(list)
+        for activity_id, key in self.manifest.items():
+            shards[key].append(activity_id)
+        write_json(self.manifest_path, {
+            "format_version": FORMAT_VERSION,
+            "shards": {key: sorted(shards[key]) for key in sorted(shards)}
+        })
+        return None
+    
+    @property
+    def shard_keys(self) -> List[str]:
+        return sorted(set(self.manifest.values()))
+    
+    def _read(self, keys: Iterable[str]) -> Dict[int, ActivityModel]:
+        activities = {}
+        for key in keys:
+            activities.update((self._shard(key).load().activities or {}).items())
+        return activities
+    
+    def load(self) -> AthleteData:
+        athlete = self.athlete.load()
+        return AthleteData(
+            activities=self._read(self.shard_keys) if self.manifest else None,
+            zones=athlete.zones,
+            stats=athlete.stats
+        )
+    
+    def save(self, data: AthleteData) -> None:
+        shards = defaultdict(dict)
+        for activity_id, activity in (data.activities or {}).items():
+            shards[shard_key(activity.start_date)][activity_id] = activity
+        
+        for path in self.directory.glob("activities/*.json"):
+            if path.stem not in shards: path.unlink()
+        for key, activities in shards.items():
+            self._shard(key).save(AthleteData(activities=activities))
+        self.athlete.save(AthleteData(zones=data.zones, stats=data.stats))
+        
+        self._manifest = {
+            i: key for key, activities in shards.items() for i in activities}
+        self._write_manifest()
+        log.debug(f"Saved {len(shards)} shards to: {self.directory.as_posix()}")
+        return None
+    
+    def upsert_activities(self, activities: Dict[int, ActivityModel]) -> None:
+        """
+        Inserts or replaces activities in their month's shard. Activities
+        whose start date moved to another month are removed from the old one.
+        """
+        manifest = self.manifest
+        shards, moved = defaultdict(dict), defaultdict(list)
+        for activity_id, activity in activities.items():
+            key = shard_key(activity.start_date)
+            if manifest.get(activity_id, key) != key:
+                moved[manifest[activity_id]].append(activity)
+            shards[key][activity_id] = activity
+        
+        for old_key, moved_activities in moved.items():
+            shard = self._shard(old_key)
+            data = shard.load()
+            for activity in moved_activities:
+                stored = (data.activities or {}).pop(activity.id, None)
+                if stored is not None and activity.weather is None:
+                    activity.weather = stored.weather
+            if data.activities:
+                shard.save(data)
+            else:
+                shard.path.unlink(missing_ok=True)
+        
+        for key, shard_activities in shards.items():
+            self._shard(key).upsert_activities(shard_activities)
+        
+        # Rewritten even w/out new ids, so it stays newer than the shards.
+        if shards:
+            manifest.update(
+                (i, key) for key, shard_activities in shards.items()
+                for i in shard_activities
+            )
+            self._write_manifest()
+        return None
+    
+    def delete_activities(self, activity_ids: Iterable[int]) -> None:
+        manifest = self.manifest
+        shards = defaultdict(list)
+        for activity_id in activity_ids:
+            if activity_id in manifest: shards[manifest.pop(activity_id)].append(activity_id)
+        
+        for key, ids in shards.items():
+            shard = self._shard(key)
+            data = shard.load()
+            for activity_id in ids: (data.activities or {}).pop(activity_id, None)
+            if data.activities:
+                shard.save(data)
+            else:
+                shard.path.unlink(missing_ok=True)
+        if shards: self._write_manifest()
+        return None
+    
+    def save_zones(self, zones: AthleteZones) -> None:
+        self.athlete.save_zones(zones)
+        return None
+    
+    def save_stats(self, stats: AthleteStatistics) -> None:
+        self.athlete.save_stats(stats)
+        return None
+    
+    def get_activities(
+        self,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None
+    ) -> Dict[int, ActivityModel]:
+        keys = [
+            key for key in self.shard_keys
+            if not (after and shard_bounds(key)[1] <= to_utc(after))
+            and not (before and shard_bounds(key)[0] >= to_utc(before))
+        ]
+        activities = self._read(keys)
+        if after is None and before is None: return activities
+        return {
+            k: a for k, a in activities.items()
+            if self.in_range(a.start_date, after, before)
+        }
+    
+    def get_activities_by_id(
+        self, activity_ids: Iterable[int]
+    ) -> Dict[int, ActivityModel]:
+        manifest = self.manifest
+        activity_ids = [i for i in activity_ids if i in manifest]
+        activities = self._read({manifest[i] for i in activity_ids})
+        return {i: activities[i] for i in activity_ids if i in activities}
+    
+    def latest_activity_date(self) -> Optional[datetime]:
+        for key in reversed(self.shard_keys):
+            activities = self._shard(key).load().activities
+            if activities:
+                return max(a.start_date for a in activities.values())
+        return None
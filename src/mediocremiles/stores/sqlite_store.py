@@ -0,0 +1,408 @@
+"""
+Contains the SQLiteStore model.
+"""
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Union, List, Any, Type, Iterable
+
+from pydantic import BaseModel
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.split_arrays import SplitArrays, SPLIT_FIELDS, INT_FIELDS
+from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.models.athlete_zones import AthleteZones
+from src.mediocremiles.models.athlete_stats import AthleteStatistics, ActivityTotal
+from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.stores.base import BaseStore
+from utils import to_utc
+
+
+log = logging.getLogger("app.stores.sqlite")
+
+
+# Fields stored in child tables rather than as activity columns.
+CHILD_FIELDS = {"splits_standard", "weather"}
+
+STAT_CATEGORIES = [
+    "recent_ride_totals", "recent_run_totals", "recent_swim_totals",
+    "ytd_ride_totals", "ytd_run_totals", "ytd_swim_totals",
+    "all_ride_totals", "all_run_totals", "all_swim_totals"
+]
+STAT_FIELDS = list(ActivityTotal.model_fields)
+
+
+
+def _sql_type(annotation: Any) -> str:
+    """
+    Returns the SQLite column type for a model field annotation.
+    """
+    annotation = str(annotation)
+    if "int" in annotation: return "INTEGER"
+    if "float" in annotation: return "REAL"
+    return "TEXT"
+
+
+def _columns(model: Type[BaseModel], exclude: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Returns the stored fields of a model with their SQLite column types.
+    """
+    return {
+        name: _sql_type(field.annotation)
+        for name, field in model.model_fields.items()
+        if name not in exclude
+    }
+
+
+ACTIVITY_COLUMNS = _columns(ActivityModel, CHILD_FIELDS)
+SPLIT_COLUMNS = {
+    name: "INTEGER" if name in INT_FIELDS else "REAL" for name in SPLIT_FIELDS}
+WEATHER_COLUMNS = _columns(Weather)
+
+
+class SQLiteStore(BaseStore):
+    """
+    Stores athlete data in SQLite tables.
+    
+    Activities are upserted by id, with splits & weather kept in child tables
+    keyed by activity id. Activities are indexed on start date (as UTC),
+    activity type & shoes, so single inserts and date range queries don't
+    scan the whole store.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self._create_tables()
+    
+    @property
+    def identity(self) -> str:
+        return f"{type(self).__name__}:{self.path.as_posix()}"
+    
+    def _create_tables(self) -> None:
+        activity_cols = ",\n".join(
+            f"{name} {sql_type}" for name, sql_type in ACTIVITY_COLUMNS.items()
+            if name != "id"
+        )
+        split_cols = ",\n".join(
+            f"{name} {sql_type}" for name, sql_type in SPLIT_COLUMNS.items())
+        weather_cols = ",\n".join(
+            f"{name} {sql_type}" for name, sql_type in WEATHER_COLUMNS.items())
+        stat_cols = ",\n".join(f"{name} REAL" for name in STAT_FIELDS)
+        
+        with self.conn:
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS activities (
+                    id INTEGER PRIMARY KEY,
+                    start_date_utc TEXT,
+                    {activity_cols}
+                );
+                CREATE INDEX IF NOT EXISTS idx_activities_start_date
+                    ON activities (start_date_utc);
+                CREATE INDEX IF NOT EXISTS idx_activities_activity_type
+                    ON activities (activity_type);
+                CREATE INDEX IF NOT EXISTS idx_activities_shoes
+                    ON activities (shoes);
+                
+                CREATE TABLE IF NOT EXISTS splits (
+                    activity_id INTEGER NOT NULL
+                        REFERENCES activities (id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    {split_cols},
+                    PRIMARY KEY (activity_id, position)
+                );
+                
+                CREATE TABLE IF NOT EXISTS weather (
+                    activity_id INTEGER PRIMARY KEY
+                        REFERENCES activities (id) ON DELETE CASCADE,
+                    {weather_cols}
+                );
+                
+                CREATE TABLE IF NOT EXISTS zones (
+                    zone_type TEXT NOT NULL,
+                    zone_number INTEGER NOT NULL,
+                    min_value INTEGER,
+                    max_value INTEGER,
+                    PRIMARY KEY (zone_type, zone_number)
+                );
+                
+                CREATE TABLE IF NOT EXISTS stats (
+                    category TEXT PRIMARY KEY,
+                    {stat_cols}
+                );
+                
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+        return None
+    
+    def _upsert_activities(self, activities: Iterable[ActivityModel]) -> None:
+        """
+        Upserts activities & replaces their child rows (stored weather is kept
+        for activities w/out weather). Runs in the caller's transaction.
+        """
+        columns = ["start_date_utc", *ACTIVITY_COLUMNS]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        activity_sql = (
+            f"INSERT INTO activities ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}"
+        )
+        split_sql = (
+            f"INSERT INTO splits (activity_id, position, {', '.join(SPLIT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(SPLIT_COLUMNS) + 2))})"
+        )
+        weather_sql = (
+            f"INSERT OR REPLACE INTO weather (activity_id, {', '.join(WEATHER_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(WEATHER_COLUMNS) + 1))})"
+        )
+        
+        for activity in activities:
+            row = activity.model_dump(mode="json", include=set(ACTIVITY_COLUMNS))
+            start_date_utc = (
+                to_utc(activity.start_date).isoformat()
+                if activity.start_date else None
+            )
+            self.conn.execute(
+                activity_sql,
+                [start_date_utc, *(row[c] for c in ACTIVITY_COLUMNS)]
+            )
+            
+            self.conn.execute(
+                "DELETE FROM splits WHERE activity_id = ?", (activity.id,))
+            self.conn.executemany(split_sql, [
+                [activity.id, i, *(s[c] for c in SPLIT_COLUMNS)]
+                for i, s in enumerate(self._dump_splits(activity.splits_standard))
+            ])
+            
+            # Activities w/out weather keep the weather already stored.
+            if activity.weather is not None:
+                weather = activity.weather.model_dump(
+                    mode="json", include=set(WEATHER_COLUMNS))
+                self.conn.execute(
+                    weather_sql,
+                    [activity.id, *(weather[c] for c in WEATHER_COLUMNS)]
+                )
+        return None
+    
+    @staticmethod
+    def _dump_splits(splits: Optional[SplitArrays]) -> List[Dict[str, Any]]:
+        if not splits: return []
+        return splits.to_records()
+    
+    def _read_activities(
+        self, where: str = "", params: Iterable[Any] = ()
+    ) -> Dict[int, ActivityModel]:
+        """
+        Returns activities (w/ splits & weather) matching the where clause.
+        """
+        rows = self.conn.execute(
+            f"SELECT * FROM activities {where} ORDER BY start_date_utc",
+            list(params)
+        ).fetchall()
+        if not rows: return {}
+        
+        ids = [row["id"] for row in rows]
+        id_params = ", ".join("?" * len(ids))
+        
+        splits: Dict[int, List[Dict]] = {}
+        for split in self.conn.execute(
+            f"SELECT * FROM splits WHERE activity_id IN ({id_params}) "
+            "ORDER BY activity_id, position", ids
+        ):
+            splits.setdefault(split["activity_id"], []).append(
+                {c: split[c] for c in SPLIT_COLUMNS})
+        
+        weather = {
+            w["activity_id"]: {c: w[c] for c in WEATHER_COLUMNS}
+            for w in self.conn.execute(
+                f"SELECT * FROM weather WHERE activity_id IN ({id_params})", ids)
+        }
+        
+        activities = {}
+        for row in rows:
+            record = {c: row[c] for c in ACTIVITY_COLUMNS}
+            record["splits_standard"] = splits.get(row["id"])
+            record["weather"] = weather.get(row["id"])
+            activities[row["id"]] = ActivityModel.model_validate(record)
+        return activities
+    
+    def _read_zones(self) -> Optional[AthleteZones]:
+        fetched_at = self._get_meta("zones_fetched_at")
+        if fetched_at is None: return None
+        
+        zones = {"heart_rate": [], "power": []}
+        for row in self.conn.execute(
+            "SELECT * FROM zones ORDER BY zone_type, zone_number"
+        ):
+            zones[row["zone_type"]].append(row)
+        
+        return AthleteZones.model_validate({
+            "heart_rate_zones": [
+                {"zone_number": z["zone_number"],
+                 "min_bpm": z["min_value"], "max_bpm": z["max_value"]}
+                for z in zones["heart_rate"]
+            ],
+            "power_zones": [
+                {"zone_number": z["zone_number"],
+                 "min_watts": z["min_value"], "max_watts": z["max_value"]}
+                for z in zones["power"]
+            ],
+            "fetched_at": fetched_at
+        })
+    
+    def _write_zones(self, zones: AthleteZones) -> None:
+        self.conn.execute("DELETE FROM zones")
+        self.conn.executemany(
+            "INSERT INTO zones VALUES (?, ?, ?, ?)",
+            [
+                ("heart_rate", z.zone_number, z.min_bpm, z.max_bpm)
+                for z in zones.heart_rate_zones if z
+            ] + [
+                # Power zones are built w/ the heart rate zone model upstream.
+                ("power", z.zone_number,
+                 getattr(z, "min_watts", getattr(z, "min_bpm", None)),
+                 getattr(z, "max_watts", getattr(z, "max_bpm", None)))
+                for z in zones.power_zones if z
+            ]
+        )
+        self._set_meta("zones_fetched_at", zones.fetched_at)
+        return None
+    
+    def _read_stats(self) -> Optional[AthleteStatistics]:
+        fetched_at = self._get_meta("stats_fetched_at")
+        if fetched_at is None: return None
+        
+        stats: Dict[str, Any] = {
+            row["category"]: {c: row[c] for c in STAT_FIELDS}
+            for row in self.conn.execute("SELECT * FROM stats")
+        }
+        stats["biggest_ride_distance"] = self._get_meta("biggest_ride_distance")
+        stats["biggest_climb_elevation_gain"] = self._get_meta(
+            "biggest_climb_elevation_gain")
+        stats["fetched_at"] = fetched_at
+        return AthleteStatistics.model_validate(stats)
+    
+    def _write_stats(self, stats: AthleteStatistics) -> None:
+        self.conn.execute("DELETE FROM stats")
+        self.conn.executemany(
+            f"INSERT INTO stats VALUES ({', '.join('?' * (len(STAT_FIELDS) + 1))})",
+            [
+                (category, *(getattr(getattr(stats, category), c) for c in STAT_FIELDS))
+                for category in STAT_CATEGORIES
+            ]
+        )
+        self._set_meta("biggest_ride_distance", stats.biggest_ride_distance)
+        self._set_meta(
+            "biggest_climb_elevation_gain", stats.biggest_climb_elevation_gain)
+        self._set_meta("stats_fetched_at", stats.fetched_at)
+        return None
+    
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+    
+    def _set_meta(self, key: str, value: Any) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            (key, None if value is None else str(value))
+        )
+        return None
+    
+    def load(self) -> AthleteData:
+        with self._lock:
+            return AthleteData(
+                activities=self._read_activities() or None,
+                zones=self._read_zones(),
+                stats=self._read_stats()
+            )
+    
+    def save(self, data: AthleteData) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM activities")
+            self._upsert_activities((data.activities or {}).values())
+            
+            self.conn.execute("DELETE FROM zones")
+            self.conn.execute(
+                "DELETE FROM meta WHERE key IN "
+                "('zones_fetched_at', 'stats_fetched_at')"
+            )
+            if data.zones: self._write_zones(data.zones)
+            
+            self.conn.execute("DELETE FROM stats")
+            if data.stats: self._write_stats(data.stats)
+        return None
+    
+    def upsert_activities(self, activities: Dict[int, ActivityModel]) -> None:
+        with self._lock, self.conn:
+            self._upsert_activities(activities.values())
+        log.debug(f"Upserted activity ids: {set(activities)}")
+        return None
+    
+    def delete_activities(self, activity_ids: Iterable[int]) -> None:
+        # Child rows are deleted w/ their activity (ON DELETE CASCADE).
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM activities WHERE id = ?",
+                [(i,) for i in activity_ids]
+            )
+        return None
+    
+    def save_zones(self, zones: AthleteZones) -> None:
+        with self._lock, self.conn:
+            self._write_zones(zones)
+        return None
+    
+    def save_stats(self, stats: AthleteStatistics) -> None:
+        with self._lock, self.conn:
+            self._write_stats(stats)
+        return None
+    
+    def get_activities(
+        self,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None
+    ) -> Dict[int, ActivityModel]:
+        clauses, params = [], []
+        if after:
+            clauses.append("start_date_utc > ?")
+            params.append(to_utc(after).isoformat())
+        if before:
+            clauses.append("start_date_utc < ?")
+            params.append(to_utc(before).isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        with self._lock:
+            return self._read_activities(where, params)
+    
+    def get_activities_by_id(
+        self, activity_ids: Iterable[int]
+    ) -> Dict[int, ActivityModel]:
+        activity_ids = list(activity_ids)
+        if not activity_ids: return {}
+        with self._lock:
+            return self._read_activities(
+                f"WHERE id IN ({', '.join('?' * len(activity_ids))})", activity_ids)
+    
+    def latest_activity_date(self) -> Optional[datetime]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT start_date FROM activities "
+                "ORDER BY start_date_utc DESC LIMIT 1"
+            ).fetchone()
+        if row is None or row["start_date"] is None: return None
+        return datetime.fromisoformat(row["start_date"])
+    
+    def close(self) -> None:
+        self.conn.close()
+        return None
@@ -4,17 +4,27 @@ Contains the StravaClient model.
 import logging
 import time
 import json
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from enum import IntEnum
 from os import environ
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Tuple, Iterator
 from pathlib import Path
 
+import requests
 from stravalib import Client
-from stravalib.util.limiter import DefaultRateLimiter
-from stravalib.model import DetailedActivity, SummaryActivity, AthleteStats
+from stravalib.util.limiter import get_rates_from_response_headers
+from stravalib.model import (
+    DetailedActivity, SummaryActivity, AthleteStats, DetailedAthlete
+)
 from stravalib.strava_model import Zones
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.response_cache import ResponseCache, HTTP_CACHE
+from src.mediocremiles.token_manager import TokenManager
 from utils import load_config, load_envs
 
 
@@ -25,6 +35,275 @@ CONFIGS = load_config()
 ENV_VARS: Dict[str, str] = CONFIGS["env"]
 PATHS: Dict[str, Any] = CONFIGS["paths"]
 ROUTES: Dict[str, Any] = CONFIGS["routes"]
+RATE_LIMITS: Dict[str, int] = CONFIGS.get("rate_limits", {})
+PAGE_SIZE: int = CONFIGS.get("processing", {}).get("page_size", 200)
+
+# Host stravalib sends requests to; rewritten to `routes.api_url` if set.
+STRAVA_URL = "https://www.strava.com"
+
+# Strava's short (15min) & long (daily) rate limit windows, in seconds.
+SHORT_WINDOW = 15 * 60
+LONG_WINDOW = 24 * 60 * 60
+
+
+
+class RequestPriority(IntEnum):
+    """
+    Request priorities (lower is served first).
+    """
+    INCREMENTAL = 0
+    ROUTINE = 1
+    BACKFILL = 2
+
+
+class RequestScheduler:
+    """
+    Rate-limit-aware scheduler for Strava API requests.
+    
+    Strava limits requests per 15 minutes (reset on the quarter hour) and per
+    day (reset at midnight UTC). Requests wait in `acquire` until both windows
+    have budget, highest priority first. Usage is updated from Strava's
+    rate-limit response headers (the scheduler is passed to stravalib as its
+    rate limiter) and kept in a state file, so budget used by earlier runs
+    is remembered across restarts.
+    """
+    def __init__(
+        self,
+        state_file: Optional[Union[str, Path]] = None,
+        short_limit: Optional[int] = None,
+        long_limit: Optional[int] = None,
+        reserve: Optional[int] = None
+    ):
+        self.state_file = Path(
+            state_file or PATHS.get("rate_limit_state")).resolve()
+        self.reserve = RATE_LIMITS.get("reserve", 2) if reserve is None else reserve
+        
+        # Defaults are Strava's read limits, corrected by response headers.
+        self.short_limit = short_limit or RATE_LIMITS.get("short", 100)
+        self.long_limit = long_limit or RATE_LIMITS.get("long", 1000)
+        self.short_usage = self.long_usage = 0
+        self.short_window = self.long_window = 0
+        
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._local = threading.local()
+        
+        self._load_state()
+        self._roll_windows()
+    
+    @staticmethod
+    def _window_starts(now: Optional[float] = None) -> Tuple[int, int]:
+        """
+        Returns the start (epoch secs) of the current 15min & daily windows.
+        """
+        now = int(time.time() if now is None else now)
+        return now - now % SHORT_WINDOW, now - now % LONG_WINDOW
+    
+    def _roll_windows(self) -> None:
+        """
+        Resets usage for windows that have ended.
+        """
+        short_window, long_window = self._window_starts()
+        if short_window != self.short_window:
+            self.short_window, self.short_usage = short_window, 0
+        if long_window != self.long_window:
+            self.long_window, self.long_usage = long_window, 0
+        return None
+    
+    def _load_state(self) -> None:
+        if not self.state_file.exists(): return None
+        
+        try:
+            state = json.loads(self.state_file.read_text())
+            for key in (
+                "short_limit", "long_limit", "short_usage", "long_usage",
+                "short_window", "long_window"
+            ):
+                setattr(self, key, int(state[key]))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            log.warning(f"Ignoring invalid rate limit state file: {e}")
+        return None
+    
+    def _save_state(self) -> None:
+        state = {
+            "short_limit": self.short_limit,
+            "long_limit": self.long_limit,
+            "short_usage": self.short_usage,
+            "long_usage": self.long_usage,
+            "short_window": self.short_window,
+            "long_window": self.long_window
+        }
+        try:
+            self.state_file.parent.mkdir(exist_ok=True, parents=True)
+            tmp_file = self.state_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(state))
+            tmp_file.replace(self.state_file)
+        except OSError as e:
+            log.warning(f"Couldn't save rate limit state: {e}")
+        return None
+    
+    def _has_budget(self) -> bool:
+        return (
+            self.short_usage < self.short_limit - self.reserve
+            and self.long_usage < self.long_limit - self.reserve
+        )
+    
+    def _seconds_until_budget(self) -> float:
+        now = time.time()
+        if self.long_usage >= self.long_limit - self.reserve:
+            return self.long_window + LONG_WINDOW - now
+        return self.short_window + SHORT_WINDOW - now
+    
+    @property
+    def priority(self) -> RequestPriority:
+        """
+        Priority of requests made by the current thread.
+        """
+        return getattr(self._local, "priority", RequestPriority.ROUTINE)
+    
+    @contextmanager
+    def prioritized(self, priority: RequestPriority) -> Iterator[None]:
+        """
+        Sets the priority of requests made by the current thread.
+        """
+        previous = self.priority
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+    
+    def acquire(self, priority: Optional[RequestPriority] = None) -> None:
+        """
+        Blocks until a request can be made without exceeding the rate limits,
+        and no higher priority request is waiting. Counts the request.
+        """
+        priority = self.priority if priority is None else priority
+        entry = (int(priority), next(self._seq))
+        
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    self._roll_windows()
+                    is_next = self._waiting[0] == entry
+                    if is_next and self._has_budget():
+                        heapq.heappop(self._waiting)
+                        self.short_usage += 1
+                        self.long_usage += 1
+                        self._cond.notify_all()
+                        return None
+                    
+                    if is_next:
+                        wait = self._seconds_until_budget()
+                        log.info(
+                            f"Rate limit budget used, waiting {wait:.0f}s "
+                            f"({len(self._waiting)} requests queued)."
+                        )
+                        self._cond.wait(timeout=max(wait, 1))
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+    
+    def __call__(self, response_headers: Dict[str, str], method: str) -> None:
+        """
+        Updates usage & limits from Strava's rate-limit response headers.
+        """
+        rates = get_rates_from_response_headers(response_headers, method)
+        with self._cond:
+            self._roll_windows()
+            if rates:
+                self.short_limit = rates.short_limit
+                self.long_limit = rates.long_limit
+                # Local counts include requests still in flight.
+                self.short_usage = max(self.short_usage, rates.short_usage)
+                self.long_usage = max(self.long_usage, rates.long_usage)
+            self._save_state()
+            self._cond.notify_all()
+        return None
+    
+    def eta(self, n_requests: Optional[int] = None) -> timedelta:
+        """
+        Returns the time until `n_requests` (default: the requests currently
+        queued) can all be made within the rate limits.
+        """
+        with self._cond:
+            self._roll_windows()
+            n_left = len(self._waiting) if n_requests is None else n_requests
+            short_left = max(0, self.short_limit - self.reserve - self.short_usage)
+            long_left = max(0, self.long_limit - self.reserve - self.long_usage)
+            short_window, long_window = self.short_window, self.long_window
+            short_budget = max(1, self.short_limit - self.reserve)
+            long_budget = max(1, self.long_limit - self.reserve)
+        
+        # Steps through future windows until the budget covers the requests.
+        now = time.time()
+        start = now
+        while True:
+            n_now = min(n_left, short_left, long_left)
+            n_left -= n_now
+            short_left -= n_now
+            long_left -= n_now
+            if n_left <= 0:
+                return timedelta(seconds=max(0, start - now))
+            
+            if long_left <= 0:
+                long_window += LONG_WINDOW
+                short_window = long_window
+                long_left = long_budget
+            else:
+                short_window += SHORT_WINDOW
+                if short_window >= long_window + LONG_WINDOW:
+                    long_window += LONG_WINDOW
+                    long_left = long_budget
+            short_left = short_budget
+            start = short_window
+
+
+
+class ScheduledSession(requests.Session):
+    """
+    requests Session that waits on the scheduler before each API request.
+    GET requests to cached endpoints go through the response cache (if
+    given), and only wait on the scheduler when they're actually sent.
+    Requests to Strava are sent to `base_url` instead (e.g. a local mock
+    server), if given.
+    """
+    def __init__(
+        self,
+        scheduler: RequestScheduler,
+        cache: Optional[ResponseCache] = None,
+        base_url: Optional[str] = None
+    ):
+        super().__init__()
+        self.scheduler = scheduler
+        self.cache = cache
+        self.base_url = (base_url or STRAVA_URL).rstrip("/")
+    
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        url = str(url)
+        if self.base_url != STRAVA_URL and url.startswith(STRAVA_URL):
+            url = self.base_url + url[len(STRAVA_URL):]
+        if "/api/v3/" not in url:
+            return super().request(method, url, *args, **kwargs)
+        
+        def send(headers: Optional[Dict[str, str]] = kwargs.get("headers")):
+            self.scheduler.acquire()
+            return super(ScheduledSession, self).request(
+                method, url, *args, **{**kwargs, "headers": headers})
+        
+        if (
+            self.cache is None or method.upper() != "GET"
+            or self.cache.family(url) is None
+        ):
+            return send()
+        return self.cache.request(send, url, kwargs.get("params"), kwargs.get("headers"))
 
 
 
@@ -32,7 +311,7 @@ class StravaClient:
     """
     Handles Strava API interactions for accessing athlete data and activities.
     """
-    def __init__(self):
+    def __init__(self, offline: Optional[bool] = None):
         # Loading env. vars.
         load_envs(PATHS.get("env"))
         
@@ -44,8 +323,17 @@ class StravaClient:
         self.redirect = f"https://{host}:{port}"
         
         self.token_file = Path(PATHS.get("token")).resolve()
+        self.tokens = TokenManager(self.token_file, self._request_refresh)
         
-        self.client = Client(rate_limiter=DefaultRateLimiter("medium"))
+        self.scheduler = RequestScheduler()
+        self.cache = None
+        if HTTP_CACHE.get("enabled", True) or offline:
+            self.cache = ResponseCache(PATHS.get("http_cache"), offline=offline)
+        self.client = Client(
+            rate_limiter=self.scheduler,
+            requests_session=ScheduledSession(
+                self.scheduler, self.cache, ROUTES.get("api_url"))
+        )
         self._initiate_and_authorize()
     
     def _initiate_and_authorize(self) -> Optional[Client]:
@@ -76,29 +364,27 @@ class StravaClient:
                 log.error(f"Authorization failed: {str(e)}")
                 raise 
         
-        access_token = self._load_token_from_file()
-        self.client.access_token = access_token["access_token"]
-        self.client.refresh_token = access_token["refresh_token"]
-        self.client.token_expires = access_token["expires_at"]
+        self._apply_token(self.tokens.token)
         return None
     
     def check_refresh(self) -> bool:
         """
-        Check if token needs refresh and refresh if needed.
+        Check if token needs refresh and refresh if needed. The token is kept
+        in memory, and refreshed shortly before it expires.
         """
-        token_data = self._load_token_from_file()
+        token_data = self.tokens.get()
         if token_data:
-            if token_data['expires_at'] < time.time():
-                token_response = self.refresh_token(token_data['refresh_token'])
-                return (token_response is not None)
-            else:
-                self.client.access_token = token_data['access_token']
-                self.client.refresh_token = token_data["refresh_token"]
-                self.client.token_expires = token_data["expires_at"]
-                return True
-
+            self._apply_token(token_data)
+            return True
         return False
     
+    def _apply_token(self, token_data: dict) -> None:
+        if self.client.access_token != token_data["access_token"]:
+            self.client.access_token = token_data["access_token"]
+            self.client.refresh_token = token_data["refresh_token"]
+            self.client.token_expires = token_data["expires_at"]
+        return None
+    
     def exchange_code_for_token(self, code: str) -> None:
         """
         Exchange authorization code for access token.
@@ -115,49 +401,45 @@ class StravaClient:
         """
         Refresh the access token.
         """
-        token_file = self._load_token_from_file()
-        if not refresh_token and 'refresh_token' in token_file.keys():
-            refresh_token = token_file['refresh_token']
-            
-        if not refresh_token:
-            return None
-            
         try:
-            token_response = self.client.refresh_access_token(
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                refresh_token=refresh_token
-            )
-            
-            self._save_token_to_file(token_response)
-            self.client.access_token = token_response['access_token']
-            self.client.refresh_token = token_response['refresh_token']
-            self.client.token_expires = token_response["expires_at"]
-            
+            token_response = self.tokens.refresh(refresh_token)
+            if token_response: self._apply_token(token_response)
             return token_response
         except Exception as e:
             log.error(f"Error refreshing token: {str(e)}")
             raise
     
+    def _request_refresh(self, refresh_token: str) -> dict:
+        """
+        Requests a new token from Strava (called by the token manager).
+        """
+        return self.client.refresh_access_token(
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            refresh_token=refresh_token
+        )
+    
     def _save_token_to_file(self, token_data: dict) -> None:
         """
         Save token to file.
         """ 
-        with self.token_file.open("w") as f:
-            json.dump(token_data, f)
-        
-        log.info(f"Token data saved to: {self.token_file.as_posix()}")
+        self.tokens.set(token_data)
         return None
     
     def _load_token_from_file(self) -> Dict[str, str]:
         """
-        Load token from file.
+        Load token (from memory; the file is only read once).
         """
-        if self.token_file.exists():
-            with self.token_file.open() as f:
-                return json.load(f)
-        log.info(f"Token file loaded from: {self.token_file.as_posix()}")
-        return None
+        return self.tokens.token
+    
+    def get_athlete(self) -> DetailedAthlete:
+        """
+        Get the authenticated athlete.
+        """
+        if not self.is_authenticated(): return None
+        
+        with self.scheduler.prioritized(RequestPriority.ROUTINE):
+            return self.client.get_athlete()
     
     def get_athlete_stats(self) -> AthleteStats:
         """
@@ -165,7 +447,8 @@ class StravaClient:
         """
         if not self.is_authenticated(): return None
             
-        return self.client.get_athlete_stats()
+        with self.scheduler.prioritized(RequestPriority.ROUTINE):
+            return self.client.get_athlete_stats()
     
     def get_athlete_zones(self) -> Zones:
         """
@@ -173,7 +456,8 @@ class StravaClient:
         """
         if not self.is_authenticated(): return None
         
-        return self.client.get_athlete_zones()
+        with self.scheduler.prioritized(RequestPriority.ROUTINE):
+            return self.client.get_athlete_zones()
     
     def get_activities(
         self,
@@ -186,29 +470,63 @@ class StravaClient:
         """
         if not self.is_authenticated(): return []
         
-        # Restricted to 100 requests every 15min & 2000 daily.
+        # Rate limits are handled by the scheduler; listings go first.
         activities = None
-        while not activities:
-            try:
-                activities = self.client.get_activities(
-                    limit=limit, after=after, before=before)
-            except Exception as e:
-                log.exception(f"Exception in getting activities: {str(e)}")
-                return None
-        return list(activities)
+        with self.scheduler.prioritized(RequestPriority.INCREMENTAL):
+            while not activities:
+                try:
+                    activities = self.client.get_activities(
+                        limit=limit, after=after, before=before)
+                except Exception as e:
+                    log.exception(f"Exception in getting activities: {str(e)}")
+                    return None
+            return list(activities)
+    
+    def iter_activity_pages(
+        self,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+        page_size: Optional[int] = None
+    ) -> Iterator[List[SummaryActivity]]:
+        """
+        Yields athlete activities a page at a time, fetching each page only
+        when the previous one has been consumed.
+        """
+        if not self.is_authenticated(): return None
+        
+        page_size = page_size or PAGE_SIZE
+        activities = self.client.get_activities(after=after, before=before)
+        activities.per_page = page_size
+        
+        while True:
+            # Priority is set per page, so it doesn't leak to the consumer.
+            with self.scheduler.prioritized(RequestPriority.INCREMENTAL):
+                try:
+                    page = list(itertools.islice(activities, page_size))
+                except Exception as e:
+                    log.exception(f"Exception in getting activities: {str(e)}")
+                    raise
+            if not page: return None
+            yield page
+            
+            # stravalib restarts from the first page once the last is read.
+            if len(page) < page_size: return None
     
     def get_detailed_activity(
-        self, activity: Union[SummaryActivity, ActivityModel]
+        self, activity: Union[int, SummaryActivity, ActivityModel]
     ) -> List[DetailedActivity]:
         """
-        Gets detailed activity data with robust rate limit handling.
+        Gets detailed activity data (for an activity or activity id) with
+        robust rate limit handling.
         """
+        activity_id = getattr(activity, "id", activity)
         if not self.is_authenticated(): return None
 
         detailed_activity = None
         while not detailed_activity:
             try:
-                detailed_activity = self.client.get_activity(activity.id)
+                with self.scheduler.prioritized(RequestPriority.BACKFILL):
+                    detailed_activity = self.client.get_activity(activity_id)
             except Exception as e:
                 log.exception(f"Got exception: {str(e)}")
                 return None
@@ -222,7 +540,10 @@ class StravaClient:
             return True
         
         try:
-            self.refresh_token()
+            # None if there's no token to refresh.
+            if self.refresh_token() is None:
+                log.error("Not authenticated: no Strava token to refresh.")
+                return False
             return True
         except Exception as e:
             log.error(f"Authentication error: {e}")
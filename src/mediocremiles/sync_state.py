@@ -0,0 +1,113 @@
+"""
+Contains the SyncState model.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from utils import load_config, to_utc
+
+
+log = logging.getLogger("app.sync_state")
+
+
+CONFIGS = load_config()
+SYNC: Dict[str, Any] = CONFIGS.get("sync", {})
+
+
+
+class SyncState:
+    """
+    High-water mark for incremental activity syncs.
+    
+    Keeps the latest synced activity start date, plus the ids (and start
+    dates) of activities synced within an overlap window before it, in a
+    small sidecar file. Syncs list activities after the start of the overlap
+    window (catching late uploads) and skip the ids already seen, without
+    reading the data store.
+    """
+    def __init__(
+        self,
+        state_file: Optional[Union[str, Path]] = None,
+        overlap: Optional[timedelta] = None
+    ):
+        self.state_file = Path(
+            state_file or CONFIGS["paths"]["sync_state"]).resolve()
+        self.overlap = overlap or timedelta(days=SYNC.get("overlap_days", 2))
+        
+        self.high_water_mark: Optional[datetime] = None
+        self.recent: Dict[int, datetime] = {}
+        self._load()
+    
+    def exists(self) -> bool:
+        return self.state_file.exists()
+    
+    @property
+    def after(self) -> Optional[datetime]:
+        """
+        Start date to list activities after (None if never synced).
+        """
+        if self.high_water_mark is None: return None
+        return self.high_water_mark - self.overlap
+    
+    def bootstrap(self, latest_activity_date: Optional[datetime]) -> None:
+        """
+        Starts the high-water mark at the latest stored activity.
+        """
+        if latest_activity_date:
+            self.high_water_mark = to_utc(latest_activity_date)
+            self._save()
+        return None
+    
+    def new_activities(self, activities: Iterable[Any]) -> List[Any]:
+        """
+        Returns the activities not already synced within the overlap window.
+        """
+        return [a for a in activities if a.id not in self.recent]
+    
+    def advance(self, activities: Iterable[Any]) -> None:
+        """
+        Moves the high-water mark past synced activities.
+        """
+        for activity in activities:
+            if activity.start_date is None: continue
+            
+            start_date = to_utc(activity.start_date)
+            self.recent[activity.id] = start_date
+            if self.high_water_mark is None or start_date > self.high_water_mark:
+                self.high_water_mark = start_date
+        
+        if self.high_water_mark is None: return None
+        
+        self.recent = {
+            i: d for i, d in self.recent.items() if d >= self.after
+        }
+        self._save()
+        return None
+    
+    def _load(self) -> None:
+        if not self.exists(): return None
+        
+        try:
+            state = json.loads(self.state_file.read_text())
+            self.high_water_mark = datetime.fromisoformat(state["high_water_mark"])
+            self.recent = {
+                int(i): datetime.fromisoformat(d)
+                for i, d in state["recent"].items()
+            }
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            log.warning(f"Ignoring invalid sync state file: {e}")
+            self.high_water_mark, self.recent = None, {}
+        return None
+    
+    def _save(self) -> None:
+        self.state_file.parent.mkdir(exist_ok=True, parents=True)
+        tmp_file = self.state_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({
+            "high_water_mark": self.high_water_mark.isoformat(),
+            "recent": {str(i): d.isoformat() for i, d in self.recent.items()}
+        }))
+        tmp_file.replace(self.state_file)
+        return None
@@ -0,0 +1,100 @@
+"""
+Contains the TokenManager model.
+"""
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from utils import load_config
+
+
+log = logging.getLogger("app.token_manager")
+
+
+CONFIGS = load_config()
+TOKEN: Dict[str, Any] = CONFIGS.get("token", {})
+
+
+
+class TokenManager:
+    """
+    Keeps the Strava token in memory & refreshes it ahead of expiry.
+    
+    The token file is read once. Once the token is within `margin` seconds
+    of `expires_at`, the next call to `get` refreshes it w/ the `refresh`
+    callable (given a refresh token, returning the new token). Refreshes
+    are serialized across threads, and the token file is only written
+    (atomically) after a new token is set.
+    """
+    def __init__(
+        self,
+        token_file: Union[str, Path],
+        refresh: Callable[[str], Dict[str, Any]],
+        margin: Optional[float] = None
+    ):
+        self.token_file = Path(token_file).resolve()
+        self.margin = TOKEN.get("refresh_margin", 300) if margin is None else margin
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._token = self._read()
+    
+    @property
+    def token(self) -> Optional[Dict[str, Any]]:
+        return self._token
+    
+    def needs_refresh(self) -> bool:
+        return (
+            self._token is not None
+            and self._token["expires_at"] - self.margin <= time.time()
+        )
+    
+    def get(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the token (None if there isn't one), refreshing it first if
+        it's about to expire.
+        """
+        if not self.needs_refresh(): return self._token
+        
+        with self._lock:
+            # Another thread may have refreshed while this one waited.
+            if self.needs_refresh():
+                self._set(self._refresh(self._token["refresh_token"]))
+        return self._token
+    
+    def refresh(self, refresh_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Refreshes the token now. Returns the new token.
+        """
+        with self._lock:
+            refresh_token = refresh_token or (self._token or {}).get("refresh_token")
+            if not refresh_token: return None
+            self._set(self._refresh(refresh_token))
+        return self._token
+    
+    def set(self, token: Dict[str, Any]) -> None:
+        """
+        Replaces the token (e.g. after exchanging an authorization code).
+        """
+        with self._lock:
+            self._set(token)
+        return None
+    
+    def _set(self, token: Dict[str, Any]) -> None:
+        token = dict(token)
+        tmp_file = self.token_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(token))
+        tmp_file.replace(self.token_file)
+        
+        self._token = token
+        log.info(f"Token data saved to: {self.token_file.as_posix()}")
+        return None
+    
+    def _read(self) -> Optional[Dict[str, Any]]:
+        if not self.token_file.exists(): return None
+        
+        token = json.loads(self.token_file.read_text())
+        log.info(f"Token file loaded from: {self.token_file.as_posix()}")
+        return token
@@ -0,0 +1,52 @@
+"""
+Contains the unit conversions of the activity & weather computed fields.
+"""
+from typing import Dict
+
+import pandas as pd
+
+from utils import convert_distance, convert_speed, c_to_f
+
+
+
+def activity_units(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """
+    Returns the ActivityModel computed fields, for a frame of stored
+    activity fields (w/ `start_date` in local time).
+    """
+    start = pd.to_datetime(df["start_date"])
+    return {
+        "distance_km": convert_distance(df["total_distance_meters"], "km"),
+        "distance_miles": convert_distance(df["total_distance_meters"], "mi"),
+        "moving_time_minutes": df["total_moving_time_seconds"] / 60,
+        "elapsed_time_minutes": df["total_elapsed_time_seconds"] / 60,
+        "moving_time_hours": df["total_moving_time_seconds"] / 3600,
+        "elapsed_time_hours": df["total_elapsed_time_seconds"] / 3600,
+        "average_speed_kmh": convert_speed(df["average_speed_meters_sec"], "km"),
+        "average_speed_mph": convert_speed(df["average_speed_meters_sec"], "mi"),
+        "max_speed_kmh": convert_speed(df["max_speed_meters_sec"], "km"),
+        "max_speed_mph": convert_speed(df["max_speed_meters_sec"], "mi"),
+        "elevation_gain_feet": convert_distance(df["total_elevation_gain_meters"], "ft"),
+        "starting_week": (
+            start - pd.to_timedelta(start.dt.weekday, unit="D")).dt.normalize(),
+        "month": start.dt.month
+    }
+
+
+def weather_units(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """
+    Returns the Weather computed fields, for a frame of stored weather
+    fields. Missing or zero values convert to NaN, like the model's.
+    """
+    def nonzero(column: str) -> pd.Series:
+        values = df[column].astype("float64")
+        return values.where(values != 0)
+    
+    return {
+        "temperature_f": c_to_f(nonzero("temperature")),
+        "dew_point_f": c_to_f(nonzero("dew_point")),
+        "precipitation_inch": convert_distance(nonzero("precipitation"), "inch"),
+        "snow_inch": convert_distance(nonzero("snow"), "inch"),
+        "wind_speed_kmh": convert_speed(nonzero("wind_speed"), "km"),
+        "wind_speed_mph": convert_speed(nonzero("wind_speed"), "mi")
+    }
@@ -0,0 +1,109 @@
+"""
+Contains the WeatherEnricher model.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.data_processor import DataProcessor
+from src.mediocremiles.weather_processor import WeatherProcessor
+from utils import load_config, to_utc
+
+
+log = logging.getLogger("app.weather_enricher")
+
+
+CONFIGS = load_config()
+WEATHER: Dict[str, Any] = CONFIGS.get("weather", {})
+
+
+
+class WeatherEnricher:
+    """
+    Adds weather to stored activities that don't have it yet.
+    
+    Activities are sorted by location & start date and split into chunks, so
+    each chunk's bulk lookup covers few weather stations. Chunks are looked
+    up in a thread pool, and the results are stored from the calling thread
+    in a DataProcessor session.
+    """
+    def __init__(
+        self,
+        processor: DataProcessor,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None
+    ):
+        self.processor = processor
+        self.workers = workers or WEATHER.get("enrich_workers", 4)
+        self.chunk_size = chunk_size or WEATHER.get("enrich_chunk_size", 100)
+        self.weather_processor = WeatherProcessor()
+    
+    @staticmethod
+    def needs_weather(activity: ActivityModel) -> bool:
+        return activity.weather is None and activity.start_lat is not None
+    
+    def missing(
+        self, activity_ids: Optional[Iterable[int]] = None
+    ) -> List[ActivityModel]:
+        """
+        Returns the stored activities (of the given ids) w/out weather.
+        """
+        self.processor.flush()
+        store = self.processor.store
+        if activity_ids is None:
+            activities = store.get_activities()
+        else:
+            # Only the given ids, so a small sync doesn't scan the store.
+            activities = store.get_activities_by_id(activity_ids)
+        return [a for a in activities.values() if self.needs_weather(a)]
+    
+    def run(self, activity_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Adds weather to the stored activities (of the given ids) w/out it.
+        Returns the number of activities enriched.
+        """
+        activities = sorted(
+            self.missing(activity_ids),
+            key=lambda a: (
+                round(a.start_lat), round(a.start_lon), to_utc(a.start_date))
+        )
+        if not activities:
+            log.info("No activities need weather.")
+            return 0
+        
+        chunks = [
+            activities[i:i + self.chunk_size]
+            for i in range(0, len(activities), self.chunk_size)
+        ]
+        log.info(
+            f"Looking up weather for {len(activities)} activities "
+            f"({len(chunks)} chunks)..."
+        )
+        
+        enriched = 0
+        with self.processor.session(), ThreadPoolExecutor(self.workers) as pool:
+            for chunk, conditions in zip(chunks, pool.map(self._lookup, chunks)):
+                found = [
+                    a.model_copy(update={"weather": w})
+                    for a, w in zip(chunk, conditions) if w is not None
+                ]
+                if not found: continue
+                
+                callback = self.processor.update_activities(found)
+                if callback != "complete":
+                    log.error(f"Error storing weather: {callback}")
+                    continue
+                enriched += len(found)
+        
+        log.info(
+            f"Added weather to {enriched} of {len(activities)} activities "
+            f"(cache: {self.weather_processor.cache.stats()})."
+        )
+        return enriched
+    
+    def _lookup(self, activities: List[ActivityModel]) -> List[Optional[Weather]]:
+        return self.weather_processor.get_bulk_conditions([
+            (a.start_lat, a.start_lon, a.start_date) for a in activities
+        ])
@@ -2,24 +2,246 @@
 Contains the WeatherProcessor model.
 """
 import logging
+import sqlite3
+import threading
+import time
 import pandas as pd
-from typing import Dict, Optional, Any, List
+from pathlib import Path
+from typing import Dict, Optional, Any, List, Sequence, Tuple, Union
 from datetime import datetime, timedelta, timezone
 
 from meteostat import Point, Hourly
+from pydantic import TypeAdapter
 
 from src.mediocremiles.models.weather import Weather
+from utils import load_config, to_utc
 
 
 log = logging.getLogger("app.weather")
 
 
+CONFIGS = load_config()
+WEATHER: Dict[str, Any] = CONFIGS.get("weather", {})
+
+# Hours after an activity's start searched for weather data.
+WINDOW = timedelta(hours=2)
+
+# Decimal places coordinates are rounded to for station lookups (~1km).
+STATION_PRECISION = 2
+
+# (latitude, longitude, start_date) of an activity.
+Location = Tuple[float, float, datetime]
+
+# Meteostat condition codes.
+CONDITION_CODES = {
+    1: "Clear",
+    2: "Fair",
+    3: "Cloudy",
+    4: "Overcast",
+    5: "Fog",
+    6: "Freezing Fog",
+    7: "Light Rain",
+    8: "Rain",
+    9: "Heavy Rain",
+    10: "Freezing Rain",
+    11: "Heavy Freezing Rain",
+    12: "Sleet",
+    13: "Heavy Sleet",
+    14: "Light Snowfall",
+    15: "Snowfall",
+    16: "Heavy Snowfall",
+    17: "Rain Shower",
+    18: "Heavy Rain Shower",
+    19: "Sleet Shower",
+    20: "Heavy Sleet Shower",
+    21: "Snow Shower",
+    22: "Heavy Snow Shower",
+    23: "Lightning",
+    24: "Hail",
+    25: "Thunderstorm",
+    26: "Heavy Thunderstorm",
+    27: "Storm"
+}
+UNKNOWN_CONDITION = "Unknown condition"
+
+# Condition code n is category n - 1, and anything else is the last category.
+CONDITION_DTYPE = pd.CategoricalDtype(
+    [*CONDITION_CODES.values(), UNKNOWN_CONDITION])
+
+# Meteostat hourly columns -> Weather fields.
+WEATHER_FIELDS = {
+    "temp": "temperature",
+    "dwpt": "dew_point",
+    "rhum": "humidity",
+    "pres": "pressure",
+    "wdir": "wind_direction",
+    "wspd": "wind_speed",
+    "snow": "snow",
+    "prcp": "precipitation",
+    "conditions": "conditions"
+}
+WEATHER_LIST = TypeAdapter(List[Weather])
+
+_cache: Optional["WeatherCache"] = None
+_cache_lock = threading.Lock()
+
+
+
+def get_cache() -> "WeatherCache":
+    """
+    Returns the weather cache shared by all WeatherProcessors.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = WeatherCache(CONFIGS["paths"]["weather_cache"])
+    return _cache
+
+
+class WeatherCache:
+    """
+    Disk-backed LRU cache of weather lookups.
+    
+    Results are keyed by coordinates rounded to a `grid` (in degrees) and
+    the UTC hour a lookup starts from (the first full hour at or after the
+    activity's start). "No data" results expire after `no_data_ttl`, as
+    Meteostat data for recent hours may not be published yet. The least
+    recently used entries are evicted past `max_size`.
+    """
+    def __init__(
+        self,
+        path: Union[str, Path],
+        grid: Optional[float] = None,
+        max_size: Optional[int] = None,
+        no_data_ttl: Optional[timedelta] = None
+    ):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.grid = grid or WEATHER.get("cache_grid", 0.01)
+        self.max_size = max_size or WEATHER.get("cache_size", 50000)
+        self.no_data_ttl = no_data_ttl or timedelta(
+            hours=WEATHER.get("no_data_ttl_hours", 24))
+        self.hits = self.misses = 0
+        
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS weather_cache (
+                key TEXT PRIMARY KEY,
+                weather TEXT,
+                used_at INTEGER NOT NULL,
+                cached_at INTEGER
+            )
+            """
+        )
+        columns = {
+            row[1] for row in self.conn.execute("PRAGMA table_info(weather_cache)")}
+        if "cached_at" not in columns:
+            # Older caches' "no data" entries are looked up again.
+            self.conn.execute("ALTER TABLE weather_cache ADD COLUMN cached_at INTEGER")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_weather_cache_used_at "
+            "ON weather_cache (used_at)"
+        )
+        self.conn.commit()
+        self._size = self.conn.execute(
+            "SELECT COUNT(*) FROM weather_cache").fetchone()[0]
+    
+    def key(self, latitude: float, longitude: float, start_date: datetime) -> str:
+        """
+        Returns the cache key for a lookup.
+        """
+        hour = to_utc(start_date).replace(tzinfo=None)
+        if hour != hour.replace(minute=0, second=0, microsecond=0):
+            hour = hour.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        
+        lat = round(round(latitude / self.grid) * self.grid, 6)
+        lon = round(round(longitude / self.grid) * self.grid, 6)
+        return f"{lat}:{lon}:{hour.isoformat(timespec='hours')}"
+    
+    def get(self, key: str) -> Tuple[bool, Optional[Weather]]:
+        """
+        Returns whether the key is cached (& not expired), and its weather.
+        """
+        expired_before = time.time_ns() - int(self.no_data_ttl.total_seconds() * 1e9)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT weather, cached_at FROM weather_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (
+                row[0] is None and (row[1] or 0) < expired_before
+            ):
+                self.misses += 1
+                return False, None
+            
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE weather_cache SET used_at = ? WHERE key = ?",
+                (time.time_ns(), key)
+            )
+            self.conn.commit()
+        
+        if row[0] is None: return True, None
+        return True, Weather.model_validate_json(row[0])
+    
+    def put(self, key: str, weather: Optional[Weather]) -> None:
+        """
+        Caches a lookup's weather (None for no data).
+        """
+        now = time.time_ns()
+        with self._lock:
+            is_new = self.conn.execute(
+                "SELECT 1 FROM weather_cache WHERE key = ?", (key,)
+            ).fetchone() is None
+            self.conn.execute(
+                """
+                INSERT INTO weather_cache (key, weather, used_at, cached_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    weather = excluded.weather, used_at = excluded.used_at,
+                    cached_at = excluded.cached_at
+                """,
+                (key, weather and weather.model_dump_json(), now, now)
+            )
+            self._size += is_new
+            
+            if self._size > self.max_size:
+                self.conn.execute(
+                    """
+                    DELETE FROM weather_cache WHERE key IN (
+                        SELECT key FROM weather_cache ORDER BY used_at LIMIT ?
+                    )
+                    """,
+                    (self._size - self.max_size,)
+                )
+                self._size = self.max_size
+            self.conn.commit()
+        return None
+    
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": self._size}
+    
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM weather_cache")
+            self.conn.commit()
+            self._size = 0
+        return None
+
 
 class WeatherProcessor:
     """
     A client for interacting with the Meteostat Python library to retrieve 
     hourly weather data for activity data.
+    
+    Lookups go through a WeatherCache (the shared one by default).
     """
+    def __init__(self, cache: Optional[WeatherCache] = None):
+        self.cache = cache or get_cache()
+        self._stations: Dict[Tuple[float, float], Tuple[str, ...]] = {}
+    
     def get_hourly_conditions(
         self, 
         latitude: float,
@@ -30,13 +252,17 @@ class WeatherProcessor:
         """
         Get hourly weather conditions for a specific location and time range.
         """
+        key = self.cache.key(latitude, longitude, start_date)
+        cached, weather = self.cache.get(key)
+        if cached: return weather
+        
         try:
-            # Ensure start_date is naive
-            start_date = start_date.replace(tzinfo=None)
+            # Meteostat times are naive UTC.
+            start_date = to_utc(start_date).replace(tzinfo=None)
             
             # Create a Point and fetch data.
             point = self._create_point(latitude, longitude, altitude)
-            end_date = start_date + timedelta(hours=2)
+            end_date = start_date + WINDOW
             data = Hourly(point, start_date, end_date)
             weather_data = data.fetch()
             
@@ -47,25 +273,124 @@ class WeatherProcessor:
                 )
             
             df = self._format_data(weather_data)
-            
-            if df.empty: return None
-            
-            weather = df.iloc[0]
-            return Weather(
-                temperature=None if pd.isna(weather["temp"]) else weather["temp"],
-                dew_point=None if pd.isna(weather["dwpt"]) else weather["dwpt"],
-                humidity=None if pd.isna(weather["rhum"]) else weather["rhum"], 
-                pressure=None if pd.isna(weather["pres"]) else weather["pres"],
-                wind_direction=None if pd.isna(weather["wdir"]) else weather["wdir"],
-                wind_speed=None if pd.isna(weather["wspd"]) else weather["wspd"],
-                snow=None if pd.isna(weather["snow"]) else weather["snow"],
-                precipitation=None if pd.isna(weather["prcp"]) else weather["prcp"],
-                conditions=None if pd.isna(weather["conditions"]) else weather["conditions"]
-            )
+            weather = None if df.empty else self._to_weathers(df.iloc[:1])[0]
         except Exception as e:
             log.exception(f"Error retrieving hourly conditions: {str(e)}")
             return None
         
+        self.cache.put(key, weather)
+        return weather
+    
+    def get_bulk_conditions(
+        self, locations: Sequence[Location]
+    ) -> List[Optional[Weather]]:
+        """
+        Get hourly weather conditions for many activity locations & start
+        dates, in the order given.
+        
+        Locations are grouped by their nearby weather stations, and each group
+        gets one Hourly fetch over its combined date span. The first hour w/
+        data within the window after each start is then joined back w/ an
+        as-of merge. Only locations missing from the cache are fetched.
+        """
+        conditions: List[Optional[Weather]] = [None] * len(locations)
+        keys = [self.cache.key(*location) for location in locations]
+        
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for position, (latitude, longitude, _) in enumerate(locations):
+            cached, conditions[position] = self.cache.get(keys[position])
+            if cached: continue
+            
+            try:
+                stations = self._nearby_stations(latitude, longitude)
+            except Exception as e:
+                log.exception(f"Error finding weather stations: {str(e)}")
+                continue
+            if stations: groups.setdefault(stations, []).append(position)
+        
+        for stations, positions in groups.items():
+            starts = pd.DataFrame({
+                "position": positions,
+                "time": [
+                    to_utc(locations[i][2]).replace(tzinfo=None)
+                    for i in positions
+                ]
+            }).sort_values("time")
+            
+            try:
+                hourly = self._fetch_stations(
+                    stations, starts["time"].min(), starts["time"].max() + WINDOW)
+            except Exception as e:
+                log.exception(f"Error retrieving hourly conditions: {str(e)}")
+                continue
+            
+            if not hourly.empty:
+                matched = pd.merge_asof(
+                    starts, hourly, on="time", direction="forward", tolerance=WINDOW
+                ).dropna(subset=["temp"])
+                for position, weather in zip(
+                    matched["position"], self._to_weathers(matched)
+                ):
+                    conditions[position] = weather
+            
+            for position in positions:
+                self.cache.put(keys[position], conditions[position])
+        
+        log.debug(
+            f"Found weather for {sum(c is not None for c in conditions)} of "
+            f"{len(locations)} activities from {len(groups)} station groups "
+            f"(cache: {self.cache.stats()})."
+        )
+        return conditions
+    
+    def _nearby_stations(
+        self, latitude: float, longitude: float
+    ) -> Tuple[str, ...]:
+        """
+        Returns the ids of the stations a Point at the coordinates resolves
+        to, best first.
+        """
+        key = (
+            round(latitude, STATION_PRECISION),
+            round(longitude, STATION_PRECISION)
+        )
+        if key not in self._stations:
+            point = self._create_point(*key)
+            self._stations[key] = tuple(point.get_stations().index)
+        return self._stations[key]
+    
+    def _fetch_stations(
+        self, stations: Tuple[str, ...], start: datetime, end: datetime
+    ) -> pd.DataFrame:
+        """
+        Fetches hourly data for stations, resolved to a single time series
+        like a Point's (the best station w/ a value, per column & hour).
+        """
+        data = Hourly(list(stations), start, end).fetch()
+        if data.empty: return data
+        
+        if "station" in data.index.names:
+            rank = {station: i for i, station in enumerate(stations)}
+            data = (
+                data.assign(rank=data.index.get_level_values("station").map(rank))
+                .sort_values("rank")
+                .drop(columns="rank")
+                .groupby(level="time")
+                .first()
+            )
+        
+        data = self._format_data(data)
+        return data.rename_axis("time").reset_index().sort_values("time")
+    
+    @staticmethod
+    def _to_weathers(data: pd.DataFrame) -> List[Weather]:
+        """
+        Returns a Weather model for each row of formatted hourly data.
+        """
+        df = data[list(WEATHER_FIELDS)].rename(columns=WEATHER_FIELDS)
+        df = df.astype(object).where(df.notna(), None)
+        return WEATHER_LIST.validate_python(df.to_dict("records"))
+        
     def _create_point(
         self,
         latitude: float,
@@ -83,42 +408,9 @@ class WeatherProcessor:
         """
         Adds standard columns removes missing values.
         """
-        df = data[~(data["temp"].isna())]
-        df.loc[:, "conditions"] = df["coco"].apply(self._map_condition_code)
-        return df
-    
-    def _map_condition_code(self, code: int) -> str:
-        """
-        map Meteostat condition code.
-        """
-        conditions = {
-            1: "Clear",
-            2: "Fair",
-            3: "Cloudy",
-            4: "Overcast",
-            5: "Fog",
-            6: "Freezing Fog",
-            7: "Light Rain",
-            8: "Rain",
-            9: "Heavy Rain",
-            10: "Freezing Rain",
-            11: "Heavy Freezing Rain",
-            12: "Sleet",
-            13: "Heavy Sleet",
-            14: "Light Snowfall",
-            15: "Snowfall",
-            16: "Heavy Snowfall",
-            17: "Rain Shower",
-            18: "Heavy Rain Shower",
-            19: "Sleet Shower",
-            20: "Heavy Sleet Shower",
-            21: "Snow Shower",
-            22: "Heavy Snow Shower",
-            23: "Lightning",
-            24: "Hail",
-            25: "Thunderstorm",
-            26: "Heavy Thunderstorm",
-            27: "Storm"
-        }
+        df = data[data["temp"].notna()].copy()
         
-        return conditions.get(code, "Unknown condition")
\ No newline at end of file
+        codes = df["coco"].fillna(0).astype(int) - 1
+        codes = codes.where(codes.between(0, len(CONDITION_CODES) - 1), len(CONDITION_CODES))
+        df["conditions"] = pd.Categorical.from_codes(codes, dtype=CONDITION_DTYPE)
+        return df
\ No newline at end of file
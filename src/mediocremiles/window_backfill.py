@@ -0,0 +1,218 @@
+"""
+Contains the WindowBackfill model.
+"""
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from stravalib.model import SummaryActivity
+
+from src.mediocremiles.strava_client import StravaClient, PAGE_SIZE
+from src.mediocremiles.data_processor import DataProcessor
+from utils import load_config, to_utc
+
+
+log = logging.getLogger("app.window_backfill")
+
+
+CONFIGS = load_config()
+BACKFILL: Dict[str, Any] = CONFIGS.get("backfill", {})
+
+
+
+@dataclass
+class Window:
+    after: datetime
+    before: datetime
+    
+    @property
+    def span(self) -> timedelta:
+        return self.before - self.after
+    
+    def split(self) -> Tuple["Window", "Window"]:
+        middle = self.after + self.span / 2
+        return Window(self.after, middle), Window(middle, self.before)
+
+
+@dataclass
+class BackfillResult:
+    stored: List[int] = field(default_factory=list)
+    failed: List[Window] = field(default_factory=list)
+
+
+class WindowBackfill:
+    """
+    Lists an athlete's full history in parallel time windows.
+    
+    History (from the athlete's creation date) is split into `after`/`before`
+    windows that are listed by separate workers. A window whose first page is
+    full is split in half & both halves are listed instead, down to
+    `min_window`. Pages are stored (& flushed) from the calling thread in a
+    DataProcessor session, de-duplicated by activity id. Workers share the
+    client, and so its request scheduler.
+    
+    Windows finish out of order, so stored activities are only reported as
+    complete once every window before their start date has been listed &
+    stored. An interrupted or failed backfill (including a page that failed
+    to store) never reports activities past a gap.
+    """
+    def __init__(
+        self,
+        client: StravaClient,
+        processor: DataProcessor,
+        workers: Optional[int] = None,
+        window: Optional[timedelta] = None,
+        min_window: Optional[timedelta] = None,
+        queue_size: Optional[int] = None
+    ):
+        self.client = client
+        self.processor = processor
+        self.workers = workers or BACKFILL.get("workers", 4)
+        self.window = window or timedelta(days=BACKFILL.get("window_days", 90))
+        self.min_window = min_window or timedelta(
+            hours=BACKFILL.get("min_window_hours", 24))
+        self.queue_size = queue_size or BACKFILL.get("queue_size", 16)
+    
+    def windows(self, after: datetime, before: datetime) -> List[Window]:
+        """
+        Splits a date range into windows of the configured span.
+        """
+        windows = []
+        while after < before:
+            windows.append(Window(after, min(after + self.window, before)))
+            after = windows[-1].before
+        return windows
+    
+    def run(
+        self,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+        on_page: Optional[Callable[[List[SummaryActivity]], None]] = None,
+        on_complete: Optional[Callable[[List[SummaryActivity]], None]] = None
+    ) -> BackfillResult:
+        """
+        Lists & stores all activities between `after` (default: the athlete's
+        creation date) & `before` (default: now). `on_page` is called w/ each
+        stored page of new activities, & `on_complete` w/ stored activities
+        (by start date) once all windows before them have been listed.
+        """
+        if after is None:
+            athlete = self.client.get_athlete()
+            after = athlete.created_at if athlete else None
+        after = to_utc(after or datetime(2009, 1, 1))
+        before = to_utc(before or datetime.now(timezone.utc))
+        
+        result = BackfillResult()
+        stored = set()
+        events = queue.Queue(self.queue_size)
+        windows = self.windows(after, before)
+        # Windows being listed or failed, & stored activities not yet
+        # reported as complete.
+        pending, held = list(windows), []
+        log.info(
+            f"Backfilling {len(windows)} windows from {after.date()} to "
+            f"{before.date()} w/ {self.workers} workers..."
+        )
+        
+        with ThreadPoolExecutor(self.workers) as pool, self.processor.session():
+            for window in windows:
+                pool.submit(self._list_window, window, events)
+            
+            # Each window ends w/ a single "done" or "failed" event.
+            outstanding = len(windows)
+            while outstanding:
+                kind, payload = events.get()
+                if kind == "page":
+                    window, page = payload
+                    page = [a for a in page if a.id not in stored]
+                    if not page: continue
+                    
+                    callback = self.processor.update_activities(page)
+                    if callback != "complete":
+                        # The window fails & stays pending, so nothing after
+                        # it is reported as complete.
+                        log.error(f"Error storing activities: {callback}")
+                        if window not in result.failed: result.failed.append(window)
+                        continue
+                    
+                    self.processor.flush()
+                    stored.update(a.id for a in page)
+                    result.stored.extend(a.id for a in page)
+                    if on_page: on_page(page)
+                    held.extend(page)
+                elif kind == "split":
+                    # Sent before the split window's "done".
+                    outstanding += len(payload)
+                    pending.extend(payload)
+                    for window in payload:
+                        pool.submit(self._list_window, window, events)
+                elif kind == "done":
+                    if payload not in result.failed: pending.remove(payload)
+                    held = self._complete(held, pending, before, on_complete)
+                elif kind == "failed":
+                    if payload not in result.failed: result.failed.append(payload)
+                
+                if kind in ("done", "failed"):
+                    outstanding -= 1
+        
+        log.info(
+            f"Backfilled {len(result.stored)} activities "
+            f"({len(result.failed)} windows failed)."
+        )
+        return result
+    
+    @staticmethod
+    def _complete(
+        held: List[SummaryActivity],
+        pending: List[Window],
+        before: datetime,
+        on_complete: Optional[Callable[[List[SummaryActivity]], None]]
+    ) -> List[SummaryActivity]:
+        """
+        Reports the held activities that start before the earliest pending
+        window. Returns those still held.
+        """
+        listed_before = min((w.after for w in pending), default=before)
+        complete, still_held = [], []
+        for activity in held:
+            if (
+                activity.start_date is None
+                or to_utc(activity.start_date) < listed_before
+            ):
+                complete.append(activity)
+            else:
+                still_held.append(activity)
+        
+        if complete and on_complete:
+            on_complete(sorted(
+                complete, key=lambda a: to_utc(a.start_date or listed_before)))
+        return still_held
+    
+    def _list_window(self, window: Window, events: queue.Queue) -> None:
+        """
+        Lists a window's activities onto the event queue, or splits it if
+        it's dense.
+        """
+        try:
+            # Strava's after & before are exclusive.
+            pages = self.client.iter_activity_pages(
+                after=window.after - timedelta(seconds=1), before=window.before)
+            
+            for n, page in enumerate(pages):
+                if n == 0 and len(page) >= PAGE_SIZE and window.span > self.min_window:
+                    pages.close()
+                    events.put(("page", (window, page)))
+                    events.put(("split", window.split()))
+                    break
+                events.put(("page", (window, page)))
+            events.put(("done", window))
+        except Exception as e:
+            log.exception(
+                f"Error listing activities from {window.after} to "
+                f"{window.before}: {e}"
+            )
+            events.put(("failed", window))
+        return None
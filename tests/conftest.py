@@ -0,0 +1,37 @@
+"""
+Shared test setup.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+
+# Modules load `configs/config.json` relative to the repo root on import.
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+
+from src.mediocremiles.models.activity import ActivityModel
+
+
+
+@pytest.fixture
+def make_activity():
+    """
+    Returns a factory of minimal activities.
+    """
+    def make(activity_id, start_date=None, **fields):
+        record = {name: None for name in ActivityModel.model_fields}
+        record.update(
+            id=activity_id,
+            start_date=start_date or datetime(2024, 1, 1, tzinfo=timezone.utc),
+            total_distance_meters=1000.0,
+            total_moving_time_seconds=300,
+            total_elapsed_time_seconds=320,
+            **fields
+        )
+        return ActivityModel.model_validate(record)
+    return make
@@ -0,0 +1,44 @@
+"""
+Tests for ColumnarExporter.
+"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from src.mediocremiles.columnar_exporter import ColumnarExporter
+from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.models.athlete_zones import AthleteZones, HeartRateZone
+
+
+pytest.importorskip("pyarrow")
+
+ZONES = AthleteZones(
+    heart_rate_zones=[HeartRateZone(zone_number=1, min_bpm=0, max_bpm=120)],
+    power_zones=[],
+    fetched_at="2024-01-01T00:00:00"
+)
+
+
+
+def test_exports_tables_by_year(tmp_path, make_activity):
+    activities = {
+        1: make_activity(1, datetime(2023, 6, 1, tzinfo=timezone.utc)),
+        2: make_activity(2, datetime(2024, 6, 1, tzinfo=timezone.utc))
+    }
+    counts = ColumnarExporter(tmp_path).export(activities)
+    
+    assert counts == {"activities": 2, "splits": 0, "weather": 0}
+    years = sorted(p.name for p in (tmp_path / "activities").iterdir())
+    assert years == ["year=2023", "year=2024"]
+    assert not (tmp_path / "athlete.json").exists()
+
+
+def test_writes_zones_and_stats_without_activities(tmp_path, make_activity):
+    activities = {1: make_activity(1)}
+    athlete = AthleteData(activities=activities, zones=ZONES)
+    ColumnarExporter(tmp_path).export(activities, athlete)
+    
+    written = json.loads((tmp_path / "athlete.json").read_text())
+    assert written["activities"] is None
+    assert written["zones"]["heart_rate_zones"][0]["max_bpm"] == 120
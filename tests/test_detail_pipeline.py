@@ -0,0 +1,77 @@
+"""
+Tests for DetailPipeline.
+"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.mediocremiles.data_processor import DataProcessor
+from src.mediocremiles.detail_pipeline import DetailPipeline
+from src.mediocremiles.models.activity import ActivityModel
+from src.mediocremiles.stores.json_store import JSONStore
+
+
+IDS = list(range(1, 41))
+
+
+
+class FakeClient:
+    def get_detailed_activity(self, activity_id):
+        if activity_id % 10 == 0: raise RuntimeError("fetch failed")
+        return SimpleNamespace(id=activity_id)
+
+
+class FailingStore(JSONStore):
+    def upsert_activities(self, activities):
+        raise OSError("disk full")
+
+
+@pytest.fixture(autouse=True)
+def transform(monkeypatch, make_activity):
+    monkeypatch.setattr(
+        ActivityModel, "from_strava_activity", lambda detailed: make_activity(detailed.id))
+
+
+def run(processor):
+    """
+    Runs the pipeline in a thread, so a hang fails the test.
+    """
+    pipeline = DetailPipeline(
+        FakeClient(), processor, fetch_workers=2, transform_workers=2, queue_size=2)
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(pipeline.run(IDS)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "pipeline hung"
+    return results[0]
+
+
+def test_stores_detailed_activities(tmp_path):
+    store = JSONStore(tmp_path / "data.json")
+    result = run(DataProcessor(batch_size=5, store=store))
+    
+    assert sorted(result.failed) == [10, 20, 30, 40]
+    assert sorted(result.completed) == [i for i in IDS if i % 10]
+    assert sorted(store.load().activities) == sorted(result.completed)
+
+
+def test_store_errors_fail_activities(tmp_path):
+    processor = DataProcessor(batch_size=100, store=FailingStore(tmp_path / "data.json"))
+    result = run(processor)
+    
+    assert result.completed == []
+    assert sorted(result.failed) == IDS
+
+
+def test_session_errors_dont_hang(tmp_path, monkeypatch):
+    processor = DataProcessor(store=JSONStore(tmp_path / "data.json"))
+    
+    def begin_session(*args):
+        raise RuntimeError("can't start session")
+    monkeypatch.setattr(processor, "begin_session", begin_session)
+    result = run(processor)
+    
+    assert result.completed == []
+    assert sorted(result.failed) == IDS
@@ -0,0 +1,85 @@
+"""
+Tests for JournalStore.
+"""
+import pytest
+
+from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.stores.journal_store import JournalStore
+
+
+
+@pytest.fixture
+def store(tmp_path, make_activity):
+    store = JournalStore(tmp_path / "data.json")
+    store.save(AthleteData(activities={1: make_activity(1), 2: make_activity(2)}))
+    return store
+
+
+def test_updates_are_journaled(store, make_activity):
+    snapshot = store.path.read_bytes()
+    store.upsert_activities({3: make_activity(3, name="new")})
+    store.delete_activities([1])
+    
+    assert store.path.read_bytes() == snapshot
+    assert len(store.journal_path.read_bytes().splitlines()) == 2
+    reopened = JournalStore(store.path).load()
+    assert sorted(reopened.activities) == [2, 3]
+    assert reopened.activities[3].name == "new"
+
+
+def test_replays_entries_appended_by_another_store(store, make_activity):
+    assert sorted(store.load().activities) == [1, 2]
+    JournalStore(store.path).upsert_activities({3: make_activity(3)})
+    
+    assert sorted(store.load().activities) == [1, 2, 3]
+
+
+def test_torn_last_line_is_ignored_then_replaced(store, make_activity):
+    store.upsert_activities({3: make_activity(3)})
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"activities": {"4": {"id": 4, "na')
+    
+    reopened = JournalStore(store.path)
+    assert sorted(reopened.load().activities) == [1, 2, 3]
+    
+    reopened.upsert_activities({5: make_activity(5)})
+    assert sorted(JournalStore(store.path).load().activities) == [1, 2, 3, 5]
+
+
+def test_unreadable_entry_is_skipped(store, make_activity):
+    with open(store.journal_path, "ab") as f:
+        f.write(b"not json\n")
+    store.upsert_activities({3: make_activity(3)})
+    
+    assert sorted(JournalStore(store.path).load().activities) == [1, 2, 3]
+
+
+def test_compacts_at_max_size(tmp_path, make_activity):
+    store = JournalStore(tmp_path / "data.json", max_mb=1 / 1024)
+    store.save(AthleteData(activities={1: make_activity(1)}))
+    
+    for i in range(2, 10):
+        store.upsert_activities({i: make_activity(i)})
+    
+    assert store._journal_size() < 1024
+    reopened = JournalStore(store.path)
+    assert sorted(reopened.load().activities) == list(range(1, 10))
+
+
+def test_compacts_old_snapshot(tmp_path, make_activity):
+    store = JournalStore(tmp_path / "data.json", max_age_hours=1e-9)
+    store.save(AthleteData(activities={1: make_activity(1)}))
+    store.upsert_activities({2: make_activity(2)})
+    
+    assert not store.journal_path.exists()
+    assert sorted(JournalStore(store.path).load().activities) == [1, 2]
+
+
+def test_compressed_snapshot(tmp_path, make_activity):
+    store = JournalStore(tmp_path / "data.json", compression="gzip")
+    store.save(AthleteData(activities={1: make_activity(1)}))
+    store.upsert_activities({2: make_activity(2)})
+    store.compact()
+    
+    assert store.path.read_bytes()[:2] == b"\x1f\x8b"
+    assert sorted(JournalStore(store.path).load().activities) == [1, 2]
@@ -0,0 +1,140 @@
+"""
+Tests for RequestScheduler.
+"""
+import threading
+import time
+
+import pytest
+
+from src.mediocremiles.strava_client import (
+    RequestPriority, RequestScheduler, SHORT_WINDOW, LONG_WINDOW
+)
+
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Window starts (epoch secs), from now & advanced by the tests.
+    """
+    short_window, long_window = RequestScheduler._window_starts()
+    clock = {"short": short_window, "long": long_window}
+    monkeypatch.setattr(
+        RequestScheduler, "_window_starts",
+        staticmethod(lambda now=None: (clock["short"], clock["long"]))
+    )
+    return clock
+
+
+def make_scheduler(tmp_path, short_limit=5, long_limit=1000, reserve=1):
+    return RequestScheduler(
+        tmp_path / "rate_limits.json", short_limit, long_limit, reserve)
+
+
+def start_acquire(scheduler, priority, acquired):
+    thread = threading.Thread(
+        target=lambda: (scheduler.acquire(priority), acquired.append(priority)),
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def next_window(scheduler, clock, span=SHORT_WINDOW):
+    clock["short"] += span
+    if span == LONG_WINDOW: clock["long"] += span
+    # Response headers wake the waiting requests.
+    scheduler({}, "GET")
+
+
+def test_waits_for_budget(tmp_path, clock):
+    scheduler = make_scheduler(tmp_path)
+    for _ in range(4):
+        scheduler.acquire()
+    
+    acquired = []
+    thread = start_acquire(scheduler, RequestPriority.ROUTINE, acquired)
+    time.sleep(0.1)
+    assert acquired == []
+    
+    next_window(scheduler, clock)
+    thread.join(5)
+    assert acquired == [RequestPriority.ROUTINE]
+    assert scheduler.short_usage == 1
+
+
+def test_daily_limit_outlasts_short_window(tmp_path, clock):
+    scheduler = make_scheduler(tmp_path, long_limit=3)
+    for _ in range(2):
+        scheduler.acquire()
+    
+    acquired = []
+    thread = start_acquire(scheduler, RequestPriority.ROUTINE, acquired)
+    next_window(scheduler, clock)
+    time.sleep(0.1)
+    assert acquired == []
+    
+    next_window(scheduler, clock, LONG_WINDOW)
+    thread.join(5)
+    assert acquired == [RequestPriority.ROUTINE]
+
+
+def test_serves_highest_priority_first(tmp_path, clock):
+    scheduler = make_scheduler(tmp_path, short_limit=2)
+    scheduler.acquire()
+    
+    acquired = []
+    backfill = start_acquire(scheduler, RequestPriority.BACKFILL, acquired)
+    wait_for(lambda: len(scheduler._waiting) == 1)
+    incremental = start_acquire(scheduler, RequestPriority.INCREMENTAL, acquired)
+    wait_for(lambda: len(scheduler._waiting) == 2)
+    
+    # One request per window: the later, higher priority one goes first.
+    next_window(scheduler, clock)
+    incremental.join(5)
+    time.sleep(0.1)
+    assert acquired == [RequestPriority.INCREMENTAL]
+    
+    next_window(scheduler, clock)
+    backfill.join(5)
+    assert acquired == [RequestPriority.INCREMENTAL, RequestPriority.BACKFILL]
+
+
+def test_thread_priority(tmp_path, clock):
+    scheduler = make_scheduler(tmp_path)
+    assert scheduler.priority == RequestPriority.ROUTINE
+    with scheduler.prioritized(RequestPriority.BACKFILL):
+        assert scheduler.priority == RequestPriority.BACKFILL
+    assert scheduler.priority == RequestPriority.ROUTINE
+
+
+def test_usage_from_headers_is_kept_across_runs(tmp_path, clock):
+    scheduler = make_scheduler(tmp_path)
+    scheduler.acquire()
+    scheduler(
+        {"X-RateLimit-Usage": "40,200", "X-RateLimit-Limit": "100,1000"}, "GET")
+    
+    restarted = make_scheduler(tmp_path)
+    assert (restarted.short_usage, restarted.long_usage) == (40, 200)
+    assert (restarted.short_limit, restarted.long_limit) == (100, 1000)
+    
+    next_window(restarted, clock)
+    assert (restarted.short_usage, restarted.long_usage) == (0, 200)
+
+
+def test_eta(tmp_path, clock):
+    scheduler = make_scheduler(tmp_path)
+    for _ in range(4):
+        scheduler.acquire()
+    
+    assert scheduler.eta(0).total_seconds() == 0
+    # 4 requests per window, w/ the current window used up.
+    assert scheduler.eta(8).total_seconds() == pytest.approx(
+        clock["short"] + 2 * SHORT_WINDOW - time.time(), abs=5)
@@ -0,0 +1,64 @@
+"""
+Tests for ResponseCache.
+"""
+import json
+
+import pytest
+import requests
+
+from src.mediocremiles.response_cache import ResponseCache
+
+
+API = "https://www.strava.com/api/v3"
+DAY = 24 * 3600
+
+
+
+def make_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(body).encode()
+    response.headers["ETag"] = '"etag"'
+    return response
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(tmp_path / "http_cache.db", offline=False, listing_max_age_hours=24)
+
+
+def listing_key(after):
+    return ResponseCache.key(f"{API}/athlete/activities", {"after": after, "page": 1})
+
+
+def age(cache, key, seconds):
+    with cache.conn:
+        cache.conn.execute(
+            "UPDATE responses SET stored_at = stored_at - ? WHERE key = ?",
+            (seconds, key))
+
+
+def test_evicts_old_listings(cache):
+    old, new = listing_key(1), listing_key(2)
+    cache.put(old, make_response([]))
+    age(cache, old, 2 * DAY)
+    
+    cache.put(new, make_response([]))
+    
+    assert cache.get(old) is None
+    assert cache.get(new) is not None
+
+
+def test_keeps_revalidated_listings_and_activities(cache):
+    listing = listing_key(1)
+    activity = ResponseCache.key(f"{API}/activities/7")
+    cache.put(listing, make_response([]))
+    cache.put(activity, make_response({"id": 7, "name": "Run"}))
+    age(cache, listing, 2 * DAY)
+    age(cache, activity, 2 * DAY)
+    cache.touch(listing)
+    
+    cache.put(listing_key(2), make_response([]))
+    
+    assert cache.get(listing) is not None
+    assert cache.get(activity) is not None
@@ -0,0 +1,71 @@
+"""
+Tests for Rollups, as kept up to date by DataProcessor.
+"""
+import pytest
+
+from src.mediocremiles.data_processor import DataProcessor
+from src.mediocremiles.rollups import Rollups
+from src.mediocremiles.stores.json_store import JSONStore
+
+
+
+@pytest.fixture
+def rollups_path(tmp_path):
+    return tmp_path / "rollups.db"
+
+
+def processor(store_path, rollups_path):
+    return DataProcessor(store=JSONStore(store_path), rollups=Rollups(rollups_path))
+
+
+def totals(processor):
+    table = processor.get_rollup("year")
+    return dict(zip(table["year"], table["count"]))
+
+
+def test_applies_updates_and_deletes(tmp_path, rollups_path, make_activity):
+    p = processor(tmp_path / "data.json", rollups_path)
+    p.update_activities([make_activity(1), make_activity(2)])
+    assert totals(p) == {"2024": 2}
+    
+    p.delete_activities([1])
+    assert totals(p) == {"2024": 1}
+
+
+def test_interrupted_write_is_applied_later(tmp_path, rollups_path, make_activity, monkeypatch):
+    p = processor(tmp_path / "data.json", rollups_path)
+    p.update_activities(make_activity(1))
+    
+    # The store is written, but the rollups aren't.
+    def crash(activities):
+        raise RuntimeError("interrupted")
+    monkeypatch.setattr(p.rollups, "apply", crash)
+    assert p.update_activities(make_activity(2)) == "interrupted"
+    monkeypatch.undo()
+    
+    assert totals(processor(tmp_path / "data.json", rollups_path)) == {"2024": 2}
+
+
+def test_interrupted_delete_is_applied_later(tmp_path, rollups_path, make_activity, monkeypatch):
+    p = processor(tmp_path / "data.json", rollups_path)
+    p.update_activities([make_activity(1), make_activity(2)])
+    
+    def crash(activity_ids):
+        raise RuntimeError("interrupted")
+    monkeypatch.setattr(p.rollups, "delete", crash)
+    with pytest.raises(RuntimeError):
+        p.delete_activities([1])
+    monkeypatch.undo()
+    
+    assert totals(processor(tmp_path / "data.json", rollups_path)) == {"2024": 1}
+
+
+def test_rebuilt_for_another_store(tmp_path, rollups_path, make_activity):
+    first = processor(tmp_path / "first.json", rollups_path)
+    first.update_activities([make_activity(1), make_activity(2)])
+    
+    second = DataProcessor(store=JSONStore(tmp_path / "second.json"))
+    second.update_activities(make_activity(3))
+    
+    assert totals(processor(tmp_path / "second.json", rollups_path)) == {"2024": 1}
+    assert totals(processor(tmp_path / "first.json", rollups_path)) == {"2024": 2}
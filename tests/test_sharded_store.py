@@ -0,0 +1,83 @@
+"""
+Tests for ShardedStore.
+"""
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from src.mediocremiles.models.athlete_data import AthleteData
+from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.stores.sharded_store import ShardedStore
+
+
+JAN = datetime(2024, 1, 15, tzinfo=timezone.utc)
+FEB = datetime(2024, 2, 15, tzinfo=timezone.utc)
+MAR = datetime(2024, 3, 15, tzinfo=timezone.utc)
+WEATHER = Weather(
+    temperature=10.0, dew_point=5.0, humidity=60.0, pressure=1010.0,
+    wind_direction=90.0, wind_speed=3.0, snow=0.0, precipitation=0.0,
+    conditions="clear"
+)
+
+
+
+@pytest.fixture
+def store(tmp_path, make_activity):
+    store = ShardedStore(tmp_path / "shards")
+    store.save(AthleteData(activities={
+        1: make_activity(1, JAN, weather=WEATHER),
+        2: make_activity(2, FEB)
+    }))
+    return store
+
+
+def shard_files(store):
+    return sorted(p.stem for p in store.directory.glob("activities/*.json"))
+
+
+def test_shards_by_month(store, make_activity):
+    store.upsert_activities({3: make_activity(3, MAR)})
+    
+    assert shard_files(store) == ["2024-01", "2024-02", "2024-03"]
+    reopened = ShardedStore(store.directory)
+    assert sorted(reopened.load().activities) == [1, 2, 3]
+    assert list(reopened.get_activities(after=FEB)) == [3]
+    assert reopened.latest_activity_date() == MAR
+
+
+def test_moved_activity_keeps_weather(store, make_activity):
+    store.upsert_activities({1: make_activity(1, MAR)})
+    
+    reopened = ShardedStore(store.directory)
+    assert shard_files(reopened) == ["2024-02", "2024-03"]
+    assert reopened.manifest == {1: "2024-03", 2: "2024-02"}
+    assert reopened.get_activities_by_id([1])[1].weather == WEATHER
+
+
+def test_manifest_rebuilt_after_interrupted_write(store, make_activity, monkeypatch):
+    time.sleep(0.05)
+    # The shard is written, but not the manifest.
+    def crash():
+        raise OSError("interrupted")
+    monkeypatch.setattr(store, "_write_manifest", crash)
+    with pytest.raises(OSError):
+        store.upsert_activities({3: make_activity(3, MAR)})
+    monkeypatch.undo()
+    
+    reopened = ShardedStore(store.directory)
+    assert reopened.manifest[3] == "2024-03"
+    assert list(reopened.get_activities_by_id([3])) == [3]
+
+
+def test_stale_manifest_doesnt_abort_upserts(store, make_activity):
+    # The manifest says activity 2 is in January, where it isn't.
+    store.manifest[2] = "2024-01"
+    store._write_manifest()
+    
+    store.upsert_activities({2: make_activity(2, MAR)})
+    store.delete_activities([1])
+    
+    reopened = ShardedStore(store.directory)
+    assert reopened.manifest == {2: "2024-03"}
+    assert sorted(reopened.get_activities()) == [2]
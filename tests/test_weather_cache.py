@@ -0,0 +1,45 @@
+"""
+Tests for WeatherCache.
+"""
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from src.mediocremiles.models.weather import Weather
+from src.mediocremiles.weather_processor import WeatherCache
+
+
+START = datetime(2024, 1, 1, 7, 30, tzinfo=timezone.utc)
+WEATHER = Weather(
+    temperature=10.0, dew_point=5.0, humidity=60.0, pressure=1010.0,
+    wind_direction=90.0, wind_speed=3.0, snow=0.0, precipitation=0.0,
+    conditions="Clear"
+)
+
+
+
+def test_no_data_expires(tmp_path):
+    cache = WeatherCache(tmp_path / "cache.db", no_data_ttl=timedelta(hours=1))
+    key = cache.key(52.5, 13.4, START)
+    cache.put(key, None)
+    assert cache.get(key) == (True, None)
+    
+    expired = WeatherCache(tmp_path / "cache.db", no_data_ttl=timedelta(microseconds=1))
+    assert expired.get(key) == (False, None)
+    
+    expired.put(key, WEATHER)
+    assert expired.get(key) == (True, WEATHER)
+
+
+def test_older_cache_is_migrated(tmp_path):
+    conn = sqlite3.connect(tmp_path / "cache.db")
+    conn.execute(
+        "CREATE TABLE weather_cache "
+        "(key TEXT PRIMARY KEY, weather TEXT, used_at INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO weather_cache VALUES (?, ?, 0)", [
+        ("no-data", None), ("weather", WEATHER.model_dump_json())])
+    conn.commit()
+    conn.close()
+    
+    cache = WeatherCache(tmp_path / "cache.db")
+    assert cache.get("no-data") == (False, None)
+    assert cache.get("weather") == (True, WEATHER)
@@ -0,0 +1,132 @@
+"""
+Tests for WindowBackfill.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from src.mediocremiles.window_backfill import WindowBackfill
+
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+
+class FakeProcessor:
+    """
+    Buffers updates until flushed, like a DataProcessor session.
+    """
+    def __init__(self):
+        self.pending, self.stored = [], {}
+    
+    @contextmanager
+    def session(self):
+        try:
+            yield self
+        finally:
+            self.flush()
+    
+    def update_activities(self, page):
+        self.pending.extend(page)
+        return "complete"
+    
+    def flush(self):
+        self.stored.update((a.id, a) for a in self.pending)
+        self.pending = []
+
+
+class FakeClient:
+    """
+    Lists one activity per day. Listing a window waits for its gate, if any,
+    & fails if its start is in `failing`.
+    """
+    def __init__(self, gates=None, failing=()):
+        self.gates = gates or {}
+        self.failing = set(failing)
+    
+    def iter_activity_pages(self, after, before):
+        after += timedelta(seconds=1)
+        if after in self.gates: self.gates[after].wait(5)
+        if after in self.failing: raise RuntimeError("listing failed")
+        
+        day = after
+        page = []
+        while day < before:
+            page.append(SimpleNamespace(id=int(day.timestamp()), start_date=day))
+            day += timedelta(days=1)
+        yield page
+
+
+def backfill(client, processor, window_days=10):
+    return WindowBackfill(
+        client, processor, workers=3, window=timedelta(days=window_days))
+
+
+def test_pages_are_flushed_before_on_page():
+    processor = FakeProcessor()
+    unflushed = []
+    
+    def on_page(page):
+        unflushed.extend(a.id for a in page if a.id not in processor.stored)
+    
+    result = backfill(FakeClient(), processor).run(
+        START, START + timedelta(days=30), on_page=on_page)
+    
+    assert len(result.stored) == 30
+    assert unflushed == []
+
+
+def test_completion_waits_for_earlier_windows():
+    # The oldest window finishes last.
+    gate = threading.Event()
+    processor = FakeProcessor()
+    completed = []
+    
+    def on_complete(activities):
+        # Nothing is reported until the oldest window is stored.
+        assert int(START.timestamp()) in processor.stored
+        completed.extend(activities)
+    
+    def on_page(page):
+        if len(processor.stored) >= 20: gate.set()
+    
+    result = backfill(FakeClient(gates={START: gate}), processor).run(
+        START, START + timedelta(days=30), on_page=on_page,
+        on_complete=on_complete
+    )
+    
+    assert len(result.stored) == 30
+    dates = [a.start_date for a in completed]
+    assert len(dates) == 30 and dates == sorted(dates)
+
+
+def test_failed_window_stops_completion():
+    failed_start = START + timedelta(days=10)
+    completed = []
+    
+    result = backfill(FakeClient(failing={failed_start}), FakeProcessor()).run(
+        START, START + timedelta(days=30), on_complete=completed.extend)
+    
+    assert [w.after for w in result.failed] == [failed_start]
+    assert len(result.stored) == 20
+    assert max(a.start_date for a in completed) < failed_start
+
+
+def test_failed_page_stops_completion():
+    failed_start = START + timedelta(days=10)
+    processor = FakeProcessor()
+    update_activities = processor.update_activities
+    
+    def failing_update(page):
+        if any(a.start_date == failed_start for a in page): return "disk full"
+        return update_activities(page)
+    processor.update_activities = failing_update
+    completed = []
+    
+    result = backfill(FakeClient(), processor).run(
+        START, START + timedelta(days=30), on_complete=completed.extend)
+    
+    assert [w.after for w in result.failed] == [failed_start]
+    assert len(result.stored) == 20
+    assert max(a.start_date for a in completed) < failed_start
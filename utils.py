@@ -1,19 +1,39 @@
 """
 Useful functions.
 """
+import gzip
+import io
 import logging
 import json
-from datetime import datetime, timedelta
+import os
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from typing import Dict, Union, List, Any, TypeVar, Literal, Type
+from functools import lru_cache
+from typing import Dict, Union, List, Any, TypeVar, Literal, Type, Optional
 from pathlib import Path
 
 import pydantic
 
+try:
+    # Optional fast JSON backend.
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Optional zstd compression.
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 log = logging.getLogger("app.utils")
 
 
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
 T = TypeVar("T")
 
 
@@ -46,13 +66,28 @@ def load_json(
     Returns the JSON object (or string) from a JSON file.
     """
     try:
-        json_data = json.loads(Path(file_path).read_text())
+        raw = read_bytes(file_path)
+        json_data = orjson.loads(raw) if orjson else json.loads(raw)
     except (json.JSONDecodeError, FileNotFoundError) as e:
         log.error(f"Error loading JSON from {file_path}: {e}")
         raise
     return json.dumps(json_data) if dumps else json_data
 
 
+def read_bytes(file_path: Union[str, Path]) -> bytes:
+    """
+    Returns a file's bytes, decompressed if it's gzip or zstd compressed.
+    """
+    raw = Path(file_path).read_bytes()
+    if raw.startswith(GZIP_MAGIC):
+        return gzip.decompress(raw)
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ImportError(f"Reading zstd compressed {file_path} requires zstandard.")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return raw
+
+
 def validate_json(json_data: dict, schema: Type[T]) -> T:
     """
     Returns the object from json schema validation.
@@ -70,19 +105,24 @@ def validate_json(json_data: dict, schema: Type[T]) -> T:
         raise
 
 
+@lru_cache(maxsize=None)
+def type_adapter(schema: Any) -> pydantic.TypeAdapter:
+    """
+    Returns the (compiled once) TypeAdapter for a schema.
+    """
+    return pydantic.TypeAdapter(schema)
+
+
 def load_json_n_validate(file_path: Union[str, Path], schema: Type[T]) -> T:
     """
-    Loads json file and validates for schema.
+    Loads json file and validates for schema. The file's bytes are parsed
+    straight into the schema, w/out building the JSON object first.
     """
     try:
-        json_data = load_json(file_path)
-        return validate_json(json_data, schema)
+        return type_adapter(schema).validate_json(read_bytes(file_path))
     except FileNotFoundError:
         log.error(f"File not found: {file_path}")
         raise
-    except json.JSONDecodeError as e:
-        log.error(f"Error decoding JSON from file '{file_path}': {e}")
-        raise
     except pydantic.ValidationError as e:
         log.error(f"Validation error for schema '{schema.__name__}': {e}")
         raise
@@ -102,14 +142,42 @@ def load_config(config: str = "configs/config.json") -> Dict[str, Any]:
     return load_json(config_file)
 
 
-def write_json(file_path: Union[str, Path], data: dict, indent: int = 4) -> None:
+def write_json(
+    file_path: Union[str, Path],
+    data: Union[dict, pydantic.BaseModel],
+    indent: Optional[int] = None,
+    fsync: bool = False,
+    exclude: Optional[Dict[str, Any]] = None,
+    compression: Optional[Literal["gzip", "zstd"]] = None
+) -> None:
     """
-    Write JSON data to a file at the given path.
+    Write JSON data (or a model, serialized as in `model_dump(mode="json")`
+    w/out the `exclude`d fields) to a file at the given path. Output is
+    compact unless an `indent` is given, optionally gzip or zstd compressed,
+    and replaces the file once fully written (& w/ `fsync`, flushed to disk).
     """
     try:
         path = Path(file_path)
         path.parent.mkdir(exist_ok=True, parents=True)
-        path.write_text(json.dumps(data, indent=indent))
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            out = _compressed_writer(f, compression)
+            if isinstance(data, pydantic.BaseModel):
+                out.write(type_adapter(type(data)).dump_json(
+                    data, indent=indent, exclude=exclude))
+            elif orjson and indent is None:
+                out.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+            else:
+                # Encoded in chunks, straight to the file.
+                separators = (",", ":") if indent is None else None
+                text = io.TextIOWrapper(out, encoding="utf-8")
+                json.dump(data, text, indent=indent, separators=separators)
+                text.detach()
+            if out is not f: out.close()
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        tmp_path.replace(path)
     except TypeError as e:
         log.error(f"Error serializing JSON data: {e}")
         raise
@@ -118,6 +186,22 @@ def write_json(file_path: Union[str, Path], data: dict, indent: int = 4) -> None
         raise
     
     
+def _compressed_writer(f: io.BufferedWriter, compression: Optional[str]) -> Any:
+    """
+    Returns a writer that compresses into `f` (or `f`, w/out compression).
+    Closing it leaves `f` open.
+    """
+    if compression is None:
+        return f
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires zstandard.")
+        return zstandard.ZstdCompressor(level=3).stream_writer(f, closefd=False)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
 def create_directories(paths: Union[List[Path], Path]) -> None:
     """
     Creates directory for path.
@@ -141,6 +225,15 @@ def get_date_n_days_ago(days: int = 30) -> datetime:
     return datetime.now() - timedelta(days=days)
 
 
+def to_utc(date: datetime) -> datetime:
+    """
+    Returns date in UTC. Naive datetimes are assumed to already be in UTC.
+    """
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+
 def convert_distance(
     meters: float, unit: Literal["m", "km", "mi", "ft", "inch"]) -> float:
     """